@@ -1,9 +1,9 @@
 from django.contrib import admin
-from django.db.models import Count
 from django.urls import reverse
 from django.utils.html import mark_safe
 
-from api.models import FavorRecipes, Ingredient, Recipe, ShoppingList, Tag
+from api.models import (FavorRecipes, Ingredient, Recipe,
+                        ShoppingCartIngredient, ShoppingList, Tag)
 
 
 class RecipeComponentAdmin(admin.TabularInline):
@@ -24,7 +24,7 @@ class RecipeAdmin(admin.ModelAdmin):
         return mark_safe('<a href="%s">%s</a>' % (url, obj.author.username))
 
     def favorite_count(self, obj):
-        return obj.favorite_count
+        return obj.favorites_count
 
     def tag_list(self, obj):
         s = list(obj.tags.values('name'))
@@ -33,11 +33,17 @@ class RecipeAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
         queryset = queryset.prefetch_related('tags', 'ingredients')
-        queryset = queryset.prefetch_related('favorite_recipes').annotate(
-            favorite_count=Count('favorite_recipes')
-        )
         return queryset
 
+    def save_related(self, request, form, formsets, change):
+        old_components = form.instance.get_components() if change else {}
+        super().save_related(request, form, formsets, change)
+        form.instance.update_search_vector()
+        if change:
+            ShoppingCartIngredient.objects.update_recipe(
+                form.instance, old_components
+            )
+
     # Версия развернута была последняя, но я допустил сразу несколько опечаток
     favorite_count.short_description = 'В избранном'
     tag_list.short_description = 'Тэги'
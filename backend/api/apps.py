@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FoodgramApiConfig(AppConfig):
     name = 'api'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        import api.signals  # noqa: F401
@@ -0,0 +1,122 @@
+"""In-process ingredient index for the autocomplete on every keystroke.
+
+The catalog is small (~2.2k rows), so each worker builds the index from
+the in-process catalog and rebuilds it with every new snapshot. Results are
+ranked: prefix matches, then infix matches by position, then typo-tolerant
+matches by trigram similarity computed the same way as pg_trgm does.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import takewhile
+from types import MappingProxyType
+
+from django.conf import settings
+
+from api.caching import INGREDIENTS
+from api.catalog import catalog
+
+
+def normalize(value):
+    return value.strip().lower().replace('ё', 'е')
+
+
+def trigrams(value):
+    result = set()
+    for word in value.split():
+        padded = f'  {word} '
+        result.update(
+            padded[pos:pos + 3] for pos in range(len(padded) - 2)
+        )
+    return result
+
+
+class IngredientIndex:
+    """Immutable index over one catalog snapshot.
+
+    A new snapshot gets a new index, so a lookup running during a rebuild
+    keeps reading the rows, keys and postings of the index it started with.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        rows = sorted(
+            (
+                {'id': obj.pk, 'name': obj.name,
+                 'measurement_unit': obj.measurement_unit}
+                for obj in snapshot.objects.values()
+            ),
+            key=lambda row: normalize(row['name'])
+        )
+        keys = [normalize(row['name']) for row in rows]
+        postings = defaultdict(list)
+        sizes = []
+        for pos, key in enumerate(keys):
+            grams = trigrams(key)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(pos)
+        self.rows, self.keys = tuple(rows), tuple(keys)
+        self.sizes = tuple(sizes)
+        self.postings = MappingProxyType({
+            gram: tuple(positions) for gram, positions in postings.items()
+        })
+
+    def search(self, query, limit):
+        query = normalize(query)
+        keys = self.keys
+        start = bisect_left(keys, query)
+        found = list(takewhile(
+            lambda pos: keys[pos].startswith(query),
+            range(start, min(start + limit, len(keys)))
+        ))
+        if len(found) < limit:
+            seen = set(found)
+            infix = sorted(
+                (key.find(query), pos) for pos, key in enumerate(keys)
+                if query in key and pos not in seen
+            )
+            found.extend(pos for _, pos in infix[:limit - len(found)])
+        if len(found) < limit:
+            found.extend(self.similar(query, set(found), limit - len(found)))
+        return [self.rows[pos] for pos in found]
+
+    def similar(self, query, exclude, limit):
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        ranked = []
+        for pos, count in shared.items():
+            if pos in exclude:
+                continue
+            similarity = count / (len(grams) + self.sizes[pos] - count)
+            if similarity >= settings.AUTOCOMPLETE_SIMILARITY:
+                ranked.append((-similarity, pos))
+        return [pos for _, pos in sorted(ranked)[:limit]]
+
+
+class Autocomplete:
+    """Current ingredient index, replaced as a whole on a new snapshot."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+
+    def get_index(self):
+        snapshot = catalog.get(INGREDIENTS)
+        index = self.index
+        if index is not None and index.snapshot is snapshot:
+            return index
+        with self.lock:
+            if self.index is None or self.index.snapshot is not snapshot:
+                self.index = IngredientIndex(snapshot)
+            return self.index
+
+    def search(self, query, limit=None):
+        return self.get_index().search(
+            query, limit or settings.AUTOCOMPLETE_LIMIT
+        )
+
+
+ingredient_index = Autocomplete()
@@ -0,0 +1,19 @@
+"""Thread pool for work that doesn't belong to the request.
+
+Image renditions and feed fan-out are queued once the transaction is
+committed, so the request neither waits for them nor holds its locks while
+they run. Tasks use their own database connection and must close it.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix='background'
+)
+
+
+def after_commit(func, *args):
+    """Run func(*args) in the pool once the transaction is committed."""
+    transaction.on_commit(lambda: executor.submit(func, *args))
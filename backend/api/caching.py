@@ -0,0 +1,132 @@
+"""Generation-based cache of materialized API responses.
+
+Every cached payload is keyed by the current generations of the scopes it
+depends on. Writes never delete cached entries: signal receivers just bump
+the generation of the affected scope, so the old keys are never read again
+and expire on their own.
+
+The same keys serve as ETags: a client holding the current one gets
+304 Not Modified before any serializer or database query runs.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.metrics import cache_timer, count_cache
+
+GENERATION_KEY = 'generation:%s'
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+
+
+def user_scope(user_id):
+    return 'user:%s' % user_id
+
+
+def get_generations(*scopes):
+    """Fetch current generations of the scopes with a single cache call."""
+    keys = [GENERATION_KEY % scope for scope in scopes]
+    with cache_timer():
+        generations = cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                # Старт с текущего времени, а не с единицы: если счётчик
+                # вытеснят из кэша, старые ключи с ним не совпадут.
+                cache.add(key, time.time_ns(), None)
+                generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_generations(*scopes):
+    for scope in scopes:
+        key = GENERATION_KEY % scope
+        with cache_timer():
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+
+def build_key(prefix, scopes, *parts):
+    generations = get_generations(*scopes)
+    raw = ':'.join(str(part) for part in (prefix, *generations, *parts))
+    return 'payload:%s:%s' % (prefix, hashlib.md5(raw.encode()).hexdigest())
+
+
+def conditional_response(request, version, handler):
+    """Answer 304 if the client holds the ETag of version, else run handler.
+
+    The ETag includes the negotiated format, since one URL can be rendered
+    both as JSON and as the browsable API page.
+    """
+    etag = quote_etag(f'{version}-{request.accepted_renderer.format}')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = handler()
+    if response.status_code in (status.HTTP_200_OK,
+                                status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = etag
+    patch_vary_headers(response, ('Accept', ))
+    return response
+
+
+class GenerationCacheMixin:
+    """Serve list and retrieve payloads from the generation cache.
+
+    `cache_scopes` lists the scopes the payload depends on, `per_user_cache`
+    adds the requesting user's scope (favorites, shopping cart, follows).
+    """
+
+    cache_scopes = ()
+    per_user_cache = False
+
+    def get_cache_key(self, request, action):
+        scopes = list(self.cache_scopes)
+        user_id = None
+        if self.per_user_cache and request.user.is_authenticated:
+            user_id = request.user.id
+            scopes.append(user_scope(user_id))
+        query = sorted(request.query_params.lists())
+        # Ссылки на картинки в ответе абсолютные и зависят от хоста
+        base_url = request.build_absolute_uri('/')
+        return build_key(
+            self.basename, scopes, action, user_id, self.kwargs, query,
+            base_url
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request, self.action)
+
+        def respond():
+            with cache_timer():
+                data = cache.get(key)
+            count_cache(data is not None)
+            if data is not None:
+                return Response(data)
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                with cache_timer():
+                    cache.set(key, response.data, settings.CACHE_TTL)
+            return response
+
+        response = conditional_response(
+            request, key.rsplit(':', 1)[-1], respond
+        )
+        if self.per_user_cache:
+            patch_vary_headers(response, ('Authorization', ))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,126 @@
+"""In-process catalog of tags and ingredients.
+
+Both tables are tiny and almost never change, so each worker loads them
+lazily on first use and keeps an immutable snapshot per table. A snapshot is
+replaced as a whole once the `tags` or `ingredients` cache generation moves,
+so readers never see a half-built catalog and need no locking.
+"""
+import threading
+from types import MappingProxyType
+
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from api.caching import (INGREDIENTS, TAGS, conditional_response,
+                         get_generations)
+from api.models import Ingredient, Tag
+
+MODELS = {TAGS: Tag, INGREDIENTS: Ingredient}
+
+
+class Snapshot:
+    """Rows of a catalog table at the given generation."""
+
+    def __init__(self, generation, objects):
+        self.generation = generation
+        self.objects = MappingProxyType({obj.pk: obj for obj in objects})
+        self.payloads = {}
+
+    def payload(self, serializer_class):
+        """Serialize all rows once per snapshot and serializer."""
+        data = self.payloads.get(serializer_class)
+        if data is None:
+            data = serializer_class(self.objects.values(), many=True).data
+            self.payloads[serializer_class] = data
+        return data
+
+
+class Catalog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshots = {}
+
+    def get(self, scope):
+        generation, = get_generations(scope)
+        snapshot = self.snapshots.get(scope)
+        if snapshot is not None and snapshot.generation == generation:
+            return snapshot
+        with self.lock:
+            snapshot = self.snapshots.get(scope)
+            if snapshot is None or snapshot.generation != generation:
+                snapshot = Snapshot(generation, MODELS[scope].objects.all())
+                self.snapshots[scope] = snapshot
+        return snapshot
+
+    def resolve(self, scope, pks):
+        """Return {pk: object} for the found primary keys.
+
+        Misses go to the database: the generation is bumped only on commit,
+        so rows created earlier in the current transaction are not in the
+        snapshot yet.
+        """
+        objects = self.get(scope).objects
+        found = {pk: objects[pk] for pk in pks if pk in objects}
+        missing = set(pks) - found.keys()
+        if missing:
+            found.update(MODELS[scope].objects.in_bulk(missing))
+        return found
+
+
+catalog = Catalog()
+
+
+class CatalogPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Primary key field validated against the catalog, not the database."""
+
+    def __init__(self, scope, **kwargs):
+        self.scope = scope
+        kwargs.setdefault('queryset', MODELS[scope].objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        obj = catalog.resolve(self.scope, [pk]).get(pk)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+class CatalogViewMixin:
+    """Serve list and retrieve of a read-only viewset from the catalog.
+
+    The snapshot generation doubles as the ETag of every response.
+    """
+
+    catalog_scope = None
+
+    def list(self, request, *args, **kwargs):
+        snapshot = catalog.get(self.catalog_scope)
+        return conditional_response(
+            request, snapshot.generation,
+            lambda: Response(snapshot.payload(self.get_serializer_class()))
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        snapshot = catalog.get(self.catalog_scope)
+        return conditional_response(
+            request, snapshot.generation,
+            lambda: Response(self.get_serializer(self.get_object()).data)
+        )
+
+    def get_object(self):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            pk = int(lookup)
+        except ValueError:
+            raise Http404
+        obj = catalog.get(self.catalog_scope).objects.get(pk)
+        if obj is None:
+            raise Http404
+        return obj
@@ -1,5 +1,7 @@
 import django_filters as filters
 
+from api.caching import TAGS
+from api.catalog import catalog
 from api.models import Recipe
 
 FILTER_CHOICES = (
@@ -8,24 +10,50 @@ FILTER_CHOICES = (
 )
 
 
+def tag_choices():
+    return [(tag.slug, tag.name) for tag in catalog.get(TAGS).objects.values()]
+
+
 class RecipeFilter(filters.FilterSet):
     """Filter by prefetched fields 'is_favorited', 'is_in_shopping_', etc."""
 
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='tags_filter'
+    )
     is_favorited = filters.BooleanFilter(method='fav_filter')
     is_in_shopping_cart = filters.BooleanFilter(method='shop_filter')
+    search = filters.CharFilter(method='search_filter')
+
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        # Слаги уже проверены по каталогу, там же берём их id
+        tag_ids = [
+            tag.pk for tag in catalog.get(TAGS).objects.values()
+            if tag.slug in value
+        ]
+        return queryset.with_tags(tag_ids)
 
     def fav_filter(self, queryset, name, value):
+        if value and self.request.user.is_authenticated:
+            return queryset.listed_by(self.request.user, 'favorite_recipes')
         query = queryset.filter(is_favorited=value)
         return query
 
     def shop_filter(self, queryset, name, value):
+        if value and self.request.user.is_authenticated:
+            return queryset.listed_by(self.request.user, 'shop_list')
         query = queryset.filter(is_in_shopping_cart=value)
         return query
 
+    def search_filter(self, queryset, name, value):
+        return queryset.search(value)
+
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'search'
+        ]
 
 
 class IngredientFilter(filters.FilterSet):
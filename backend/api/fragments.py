@@ -0,0 +1,65 @@
+"""Cache of the viewer-independent part of serialized recipes.
+
+A fragment is everything RecipeReadSerializer returns except the author and
+the viewer's flags. Fragments are keyed by the recipe's `modified` timestamp
+and the tags/ingredients generations, so an edited recipe or catalog stops
+matching its old fragments instead of being deleted from the cache. A page
+of recipes is fetched with one get_many(), only the missing recipes get
+their tags and ingredients prefetched and serialized.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+
+from api.caching import INGREDIENTS, TAGS, get_generations
+from api.metrics import cache_timer
+from api.models import RecipeComponent
+
+# Сменить при изменении набора полей фрагмента
+FRAGMENT_KEY = 'fragment:recipe:v1:%s:%s'
+
+
+def fragment_key(recipe, generations, base_url):
+    raw = ':'.join(str(part) for part in (
+        recipe.modified.timestamp(), *generations, base_url
+    ))
+    return FRAGMENT_KEY % (recipe.pk, hashlib.md5(raw.encode()).hexdigest())
+
+
+def get_fragments(recipes, serializer_class, context):
+    """Return {recipe_id: fragment} for the recipes, serializing misses."""
+    request = context.get('request')
+    # Ссылки на картинки абсолютные, поэтому зависят от хоста
+    base_url = request.build_absolute_uri('/') if request else ''
+    generations = get_generations(TAGS, INGREDIENTS)
+    keys = {
+        recipe.pk: fragment_key(recipe, generations, base_url)
+        for recipe in recipes
+    }
+    with cache_timer():
+        cached = cache.get_many(list(keys.values()))
+    fragments = {
+        pk: cached[key] for pk, key in keys.items() if key in cached
+    }
+    missing = [recipe for recipe in recipes if recipe.pk not in fragments]
+    if missing:
+        prefetch_related_objects(
+            missing, 'tags', Prefetch(
+                'component_recipes',
+                queryset=RecipeComponent.objects.select_related('ingredient')
+            )
+        )
+        data = serializer_class(missing, many=True, context=context).data
+        fresh = {
+            recipe.pk: dict(fragment)
+            for recipe, fragment in zip(missing, data)
+        }
+        with cache_timer():
+            cache.set_many(
+                {keys[pk]: fragment for pk, fragment in fresh.items()},
+                settings.FRAGMENT_TTL
+            )
+        fragments.update(fresh)
+    return fragments
@@ -0,0 +1,88 @@
+"""Resize recipe images into renditions off the request path.
+
+The request only stores the uploaded original. Once the transaction is
+committed a background thread renders every size of IMAGE_RENDITIONS as JPEG
+and WebP and saves their storage paths to Recipe.renditions.
+"""
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from api.background import after_commit
+from api.caching import RECIPES, bump_generations
+from api.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FORMATS = (('jpeg', 'jpg'), ('webp', 'webp'))
+
+
+def schedule_renditions(recipe):
+    """Queue rendering if the image changed since the last renditions."""
+    name = recipe.image.name if recipe.image else None
+    if name and recipe.renditions.get('source') != name:
+        after_commit(render_renditions, recipe.pk, name)
+
+
+def render_renditions(recipe_id, name):
+    try:
+        with default_storage.open(name) as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+        renditions = {'source': name}
+        for title, size in settings.IMAGE_RENDITIONS.items():
+            resized = image.copy()
+            resized.thumbnail(size)
+            renditions[title] = {
+                fmt: save_rendition(resized, recipe_id, title, fmt, ext)
+                for fmt, ext in FORMATS
+            }
+        # Пока мы работали, картинку могли заменить - тогда не перетираем
+        updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+            renditions=renditions, modified=timezone.now()
+        )
+        if updated:
+            bump_generations(RECIPES)
+    except Exception:
+        logger.exception('Failed to render images of recipe %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def save_rendition(image, recipe_id, title, fmt, ext):
+    if fmt == 'jpeg' or 'A' not in image.getbands():
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, fmt, quality=settings.IMAGE_QUALITY)
+    path = f'renditions/{recipe_id}/{title}.{ext}'
+    default_storage.delete(path)
+    return default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+class RenditionsField(serializers.Field):
+    """Represent recipe renditions as {title: {format: url}}."""
+
+    def __init__(self, **kwargs):
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        result = {}
+        for title in settings.IMAGE_RENDITIONS:
+            paths = recipe.renditions.get(title, {})
+            result[title] = {
+                fmt: self.build_url(request, path)
+                for fmt, path in paths.items()
+            }
+        return result
+
+    def build_url(self, request, path):
+        url = default_storage.url(path)
+        return request.build_absolute_uri(url) if request else url
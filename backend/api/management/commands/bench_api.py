@@ -0,0 +1,271 @@
+import json
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from cachalot.api import cachalot_disabled
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.caching import RECIPES, bump_generations, user_scope
+from api.models import (FavorRecipes, Ingredient, Recipe, RecipeComponent,
+                        ShoppingCartIngredient, ShoppingList, Tag)
+from users.models import Follow, User
+
+# 1x1 GIF: картинка обязательна при создании рецепта
+IMAGE = (
+    'data:image/gif;base64,'
+    'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+)
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset and measure wall time, queries and '
+            'peak memory of the API hot paths through the whole request '
+            'stack. Results can be saved as JSON and compared with an '
+            'earlier run. All data is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--components', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='save results to a JSON file')
+        parser.add_argument('--compare', help='JSON file of an earlier run')
+
+    # Отвечают из индекса в памяти процесса, запросов к базе не делают
+    in_memory_scenarios = ('ingredient_autocomplete', )
+
+    def handle(self, *args, **options):
+        # cachalot кэширует ответы базы мимо поколений API: с ним после
+        # первого прогона чтения показывали бы 0 запросов. Настройку
+        # CACHALOT_ENABLED он читает один раз при старте, выключаем так
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media, ALLOWED_HOSTS=['testserver']
+        ), cachalot_disabled(), transaction.atomic():
+            self.user = self.seed(options)
+            results = {
+                name: self.measure(request, options['repeat'])
+                for name, request in self.scenarios()
+            }
+            transaction.set_rollback(True)
+        self.check_queries(results)
+        report = {
+            'meta': {
+                'date': datetime.now(timezone.utc).isoformat(),
+                'commit': self.commit(),
+                'vendor': connection.vendor,
+                **{key: options[key] for key in (
+                    'users', 'recipes', 'components', 'seed', 'repeat'
+                )},
+            },
+            'results': results,
+        }
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as source:
+                baseline = json.load(source)['results']
+        for name, result in results.items():
+            line = (
+                f'{name:>28}: {result["time_ms"]:9.2f} ms, '
+                f'{result["queries"]:4} queries, '
+                f'{result["peak_kib"]:9.1f} KiB'
+            )
+            if name in baseline:
+                before = baseline[name]
+                change = result['time_ms'] / before['time_ms'] - 1
+                line += (
+                    f' | time {change:+7.1%}, '
+                    f'queries {result["queries"] - before["queries"]:+d}'
+                )
+            if len(set(result['queries_per_run'])) > 1:
+                line += f' | queries per run {result["queries_per_run"]}'
+            self.stdout.write(line)
+        if options['output']:
+            with open(options['output'], 'w') as target:
+                json.dump(report, target, indent=2, ensure_ascii=False)
+
+    def check_queries(self, results):
+        """Fail if a read went to no database at all: a cache answered."""
+        cached = [
+            name for name, result in results.items()
+            if result['method'] == 'GET' and name not in
+            self.in_memory_scenarios and 0 in result['queries_per_run']
+        ]
+        if cached:
+            raise CommandError(
+                'No queries recorded for %s, the timings measure a cache.'
+                % ', '.join(cached)
+            )
+
+    def seed(self, options):
+        rnd = random.Random(options['seed'])
+        User.objects.bulk_create(
+            User(username=f'bench_{num}', email=f'bench_{num}@foodgram.local',
+                 first_name='Bench', last_name=str(num))
+            for num in range(options['users'])
+        )
+        users = list(
+            User.objects.filter(username__startswith='bench_').order_by('pk')
+        )
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=slug, slug=slug, color='#000000')
+                for slug in ('breakfast', 'lunch', 'dinner', 'supper')
+            )
+        tags = list(Tag.objects.all())
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        if not ingredients:
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'Ингредиент {num}', measurement_unit='г')
+                for num in range(500)
+            )
+            ingredients = list(
+                Ingredient.objects.values_list('pk', flat=True)
+            )
+        Recipe.objects.bulk_create(
+            Recipe(
+                # Первый рецепт - у пользователя замеров, его и обновляем
+                author=users[0] if num == 0 else rnd.choice(users),
+                name=f'Рецепт {num}',
+                text='Синтетический рецепт для замеров',
+                cooking_time=rnd.randint(5, 120)
+            )
+            for num in range(options['recipes'])
+        )
+        recipes = list(Recipe.objects.filter(
+            author__in=users
+        ).order_by('pk').values_list('pk', flat=True))
+        RecipeComponent.objects.bulk_create(
+            RecipeComponent(recipe_id=recipe, ingredient_id=ingredient,
+                            amount=rnd.randint(1, 500))
+            for recipe in recipes
+            for ingredient in rnd.sample(ingredients, options['components'])
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe, tag_id=rnd.choice(tags).pk)
+            for recipe in recipes
+        )
+        Recipe.objects.filter(pk__in=recipes).refresh_search_vectors()
+        user = users[0]
+        favorites = rnd.sample(recipes, min(50, len(recipes)))
+        cart = rnd.sample(recipes, min(20, len(recipes)))
+        FavorRecipes.objects.bulk_create(
+            FavorRecipes(author=user, recipes_id=pk) for pk in favorites
+        )
+        ShoppingList.objects.bulk_create(
+            ShoppingList(author=user, recipes_id=pk) for pk in cart
+        )
+        ShoppingCartIngredient.objects.apply_delta(
+            [user.pk], Recipe.objects.filter(pk__in=cart).total_components()
+        )
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for author in rnd.sample(users[1:], min(20, len(users) - 1))
+        )
+        self.recipe_id = recipes[0]
+        self.tag_slug = tags[0].slug
+        self.ingredients = rnd.sample(ingredients, options['components'])
+        return user
+
+    def scenarios(self):
+        anonymous = APIClient()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        filters = {
+            'recipes_list': '',
+            'recipes_list_favorited': '?is_favorited=true',
+            'recipes_list_in_cart': '?is_in_shopping_cart=true',
+            'recipes_list_tags': f'?tags={self.tag_slug}',
+            'recipes_list_author': f'?author={self.user.pk}',
+            'recipes_list_search': '?search=рецепт',
+            'recipes_list_cursor': '?pagination=cursor',
+        }
+        yield 'anon_recipes_list', lambda: anonymous.get('/api/recipes/')
+        for name, query in filters.items():
+            yield name, lambda query=query: client.get(
+                f'/api/recipes/{query}'
+            )
+        yield 'recipe_detail', lambda: client.get(
+            f'/api/recipes/{self.recipe_id}/'
+        )
+        data = {
+            'name': 'Бенчмарк', 'text': 'Рецепт для замера',
+            'cooking_time': 10, 'image': IMAGE,
+            'tags': [Tag.objects.first().pk],
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in self.ingredients
+            ],
+        }
+        yield 'recipe_create', lambda: client.post(
+            '/api/recipes/', data, format='json'
+        )
+        yield 'recipe_update', lambda: client.put(
+            f'/api/recipes/{self.recipe_id}/', data, format='json'
+        )
+        yield 'subscriptions', lambda: client.get(
+            '/api/users/subscriptions/'
+        )
+        yield 'ingredient_search', lambda: client.get(
+            '/api/ingredients/', {'name': 'мол'}
+        )
+        yield 'ingredient_autocomplete', lambda: client.get(
+            '/api/ingredients/', {'autocomplete': 'мол'}
+        )
+        yield 'shopping_list_download', lambda: client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'txt'}
+        )
+
+    def run(self, request):
+        response = request()
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, request, repeat):
+        # Замеряем путь без кэша ответов: сигналы внутри транзакции
+        # поколения не сдвигают, сдвигаем их перед каждым запросом сами
+        scopes = (RECIPES, user_scope(self.user.pk))
+        timings, counts = [], []
+        # Прогрев: каталог, индекс ингредиентов и фрагменты рецептов
+        # заполняются первым запросом, замеры идут с одинаковым состоянием
+        bump_generations(*scopes)
+        self.run(request)
+        for _ in range(repeat):
+            bump_generations(*scopes)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = self.run(request)
+                timings.append(time.perf_counter() - start)
+            # Лог запросов очищается в начале следующего запроса
+            counts.append(len(queries))
+        bump_generations(*scopes)
+        tracemalloc.start()
+        self.run(request)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'status': response.status_code,
+            'method': response.wsgi_request.method,
+            'time_ms': round(statistics.median(timings) * 1000, 3),
+            'min_ms': round(min(timings) * 1000, 3),
+            'queries': max(counts),
+            'queries_per_run': counts,
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,67 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Ingredient, ShoppingCartIngredient
+from api.views import ShoppingCartDL
+from users.models import User
+
+FORMATS = ('txt', 'csv', 'json', 'ndjson')
+
+
+class Command(BaseCommand):
+    help = ('Measure time to first byte, total time and peak memory of the '
+            'shopping list download. All data is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.make_cart(options['lines'])
+            for fmt in FORMATS:
+                runs = [self.measure(user, fmt)
+                        for _ in range(options['repeat'])]
+                ttfb, total, peak, size = min(runs)
+                self.stdout.write(
+                    f'{fmt:>6}: ttfb {ttfb * 1000:8.2f} ms, '
+                    f'total {total * 1000:8.2f} ms, '
+                    f'peak {peak / 1024:8.1f} KiB, {size} bytes'
+                )
+            transaction.set_rollback(True)
+
+    def make_cart(self, lines):
+        user = User.objects.create(
+            username='bench_cart', email='bench_cart@foodgram.local'
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {num}', measurement_unit='г')
+            for num in range(lines)
+        )
+        if not all(item.pk for item in ingredients):
+            ingredients = Ingredient.objects.order_by('-pk')[:lines]
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(user=user, ingredient=item, amount=num + 1)
+            for num, item in enumerate(ingredients)
+        )
+        return user
+
+    def measure(self, user, fmt):
+        request = APIRequestFactory().get(
+            '/api/recipes/download_shopping_cart/', {'format': fmt}
+        )
+        force_authenticate(request, user=user)
+        tracemalloc.start()
+        start = time.perf_counter()
+        chunks = iter(ShoppingCartDL.as_view()(request).streaming_content)
+        size = len(next(chunks))
+        ttfb = time.perf_counter() - start
+        size += sum(len(chunk) for chunk in chunks)
+        total = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return ttfb, total, peak, size
@@ -0,0 +1,67 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+PATHS = (
+    '/api/recipes/', '/api/recipes/?pagination=cursor', '/api/tags/',
+    '/api/ingredients/', '/api/ingredients/?name=мол',
+    '/api/ingredients/?autocomplete=мол',
+    '/api/users/subscriptions/',
+)
+
+
+class Command(BaseCommand):
+    help = ('Load a running server with concurrent GET requests to compare '
+            'deployments, e.g. SERVER_MODE=asgi against the default WSGI '
+            'workers with the same WEB_CONCURRENCY.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url')
+        parser.add_argument('paths', nargs='*', default=PATHS)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--token', help='auth token for private paths')
+
+    def handle(self, *args, **options):
+        self.local = threading.local()
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        base_url = options['base_url'].rstrip('/')
+        for path in options['paths']:
+            url = base_url + path
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                start = time.perf_counter()
+                results = list(pool.map(
+                    lambda _: self.fetch(url, headers),
+                    range(options['requests'])
+                ))
+                elapsed = time.perf_counter() - start
+            timings = sorted(timing for timing, ok in results if ok)
+            errors = len(results) - len(timings)
+            if not timings:
+                self.stdout.write(f'{path}: all {errors} requests failed')
+                continue
+            p50, p95, p99 = (
+                timings[min(len(timings) - 1, int(len(timings) * share))]
+                for share in (0.5, 0.95, 0.99)
+            )
+            self.stdout.write(
+                f'{path}: {len(results) / elapsed:8.1f} req/s, '
+                f'p50 {p50 * 1000:7.2f} ms, p95 {p95 * 1000:7.2f} ms, '
+                f'p99 {p99 * 1000:7.2f} ms, {errors} errors'
+            )
+
+    def fetch(self, url, headers):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            ok = session.get(url, headers=headers).ok
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
@@ -0,0 +1,48 @@
+import time
+
+from cachalot.api import cachalot_disabled
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from api.models import Recipe
+
+QUERIES = ('суп', 'курица с картошкой', 'шоколад', 'сливочное масло')
+
+
+class Command(BaseCommand):
+    help = ('Compare RecipeQuerySet.search() with the admin-style LIKE '
+            'search over name, text and ingredient names.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', default=QUERIES)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Иначе со второго повтора ответ отдаёт кэш cachalot, а не база
+        with cachalot_disabled():
+            self.compare(options)
+
+    def compare(self, options):
+        self.stdout.write(
+            f'{Recipe.objects.count()} recipes on {connection.vendor}'
+        )
+        for query in options['queries']:
+            like = Recipe.objects.filter(
+                Q(name__icontains=query) | Q(text__icontains=query) |
+                Q(ingredients__name__icontains=query)
+            ).distinct()
+            for title, queryset in (('like', like),
+                                    ('search', Recipe.objects.search(query))):
+                timings = [self.measure(queryset)
+                           for _ in range(options['repeat'])]
+                self.stdout.write(
+                    f'{query!r:>24} {title:>6}: '
+                    f'first page {min(timings) * 1000:9.2f} ms'
+                )
+
+    def measure(self, queryset):
+        start = time.perf_counter()
+        list(queryset[:settings.PAGE_SIZE])
+        return time.perf_counter() - start
@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from drf_extra_fields.fields import Base64ImageField
+
+from api.models import Ingredient, Recipe, Tag
+from api.serializers import RecipeWriteSerializer
+from users.models import User
+
+
+class BenchRecipeSerializer(RecipeWriteSerializer):
+    # Картинки не пишем на диск: сохранение файла к замеру не относится
+    image = Base64ImageField(required=False)
+
+
+class Command(BaseCommand):
+    help = ('Count queries and time of recipe create and update through '
+            'RecipeWriteSerializer. All data is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        size = options['ingredients']
+        with transaction.atomic():
+            author = User.objects.create(
+                username='bench_write', email='bench_write@foodgram.local'
+            )
+            tag = Tag.objects.create(
+                name='bench', color='#000000', slug='bench_write'
+            )
+            ids = list(Ingredient.objects.bulk_create(
+                Ingredient(name=f'Ингредиент {num}', measurement_unit='г')
+                for num in range(size * 2)
+            ))
+            if not all(item.pk for item in ids):
+                ids = Ingredient.objects.order_by('-pk')[:size * 2]
+            ids = [item.pk for item in ids]
+            base = [{'id': pk, 'amount': 10} for pk in ids[:size]]
+            scenarios = (
+                ('unchanged', base),
+                ('5 amounts', [
+                    {'id': item['id'], 'amount': 20 if num < 5 else 10}
+                    for num, item in enumerate(base)
+                ]),
+                ('5 swapped', base[5:] + [
+                    {'id': pk, 'amount': 10} for pk in ids[size:size + 5]
+                ]),
+                ('all new', [{'id': pk, 'amount': 10} for pk in ids[size:]]),
+            )
+            self.report('create', [
+                self.measure(None, author, tag, base)
+                for _ in range(options['repeat'])
+            ])
+            recipe = Recipe.objects.filter(author=author).first()
+            for title, ingredients in scenarios:
+                runs = []
+                for _ in range(options['repeat']):
+                    self.measure(recipe, author, tag, base)
+                    runs.append(self.measure(recipe, author, tag, ingredients))
+                self.report(title, runs)
+            transaction.set_rollback(True)
+
+    def measure(self, recipe, author, tag, ingredients):
+        if recipe:
+            recipe = Recipe.objects.prefetch_related(
+                'component_recipes__ingredient'
+            ).get(pk=recipe.pk)
+        data = {
+            'name': 'Бенчмарк', 'text': 'Рецепт для замера',
+            'cooking_time': 10, 'tags': [tag.pk], 'ingredients': ingredients
+        }
+        serializer = BenchRecipeSerializer(recipe, data=data)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            serializer.is_valid(raise_exception=True)
+            serializer.save(author=author)
+            elapsed = time.perf_counter() - start
+        return elapsed, len(queries)
+
+    def report(self, title, runs):
+        elapsed, queries = min(runs)
+        self.stdout.write(
+            f'{title:>10}: {queries:3} queries, {elapsed * 1000:8.2f} ms'
+        )
@@ -0,0 +1,89 @@
+import json
+import sys
+import time
+from contextlib import nullcontext
+from itertools import groupby
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from api.models import Recipe, RecipeComponent
+
+RecipeTag = Recipe.tags.through
+
+
+def grouped(rows):
+    """Yield (recipe_id, rows) from a stream ordered by recipe_id."""
+    for recipe_id, group in groupby(rows, key=lambda row: row[0]):
+        yield recipe_id, [row[1:] for row in group]
+
+
+def merge(recipe_id, stream, pending):
+    """Advance a grouped stream up to recipe_id and return its rows."""
+    while pending and pending[0] < recipe_id:
+        pending = next(stream, None)
+    if pending and pending[0] == recipe_id:
+        return pending[1], next(stream, None)
+    return [], pending
+
+
+class Command(BaseCommand):
+    help = ('Stream recipes with their ingredients, tags and author as '
+            'NDJSON, one recipe per line.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='File to write to, stdout by default.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.STREAM_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunk = options['chunk_size']
+        recipes = Recipe.objects.order_by('pk').values(
+            'pk', 'name', 'text', 'cooking_time', 'image',
+            author_email=F('author__email'),
+            author_username=F('author__username')
+        ).iterator(chunk_size=chunk)
+        components = grouped(RecipeComponent.objects.order_by(
+            'recipe_id', 'pk'
+        ).values_list(
+            'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+            'amount'
+        ).iterator(chunk_size=chunk))
+        tags = grouped(RecipeTag.objects.order_by(
+            'recipe_id', 'pk'
+        ).values_list('recipe_id', 'tag__slug').iterator(chunk_size=chunk))
+        output = (nullcontext(sys.stdout) if options['output'] == '-'
+                  else open(options['output'], 'w', encoding='utf-8'))
+        pending_components = next(components, None)
+        pending_tags = next(tags, None)
+        start = time.perf_counter()
+        total = 0
+        with output as stream:
+            for recipe in recipes:
+                pk = recipe.pop('pk')
+                rows, pending_components = merge(
+                    pk, components, pending_components
+                )
+                recipe['ingredients'] = [
+                    {'name': name, 'measurement_unit': unit, 'amount': amount}
+                    for name, unit, amount in rows
+                ]
+                rows, pending_tags = merge(pk, tags, pending_tags)
+                recipe['tags'] = [slug for slug, in rows]
+                recipe['author'] = {
+                    'email': recipe.pop('author_email'),
+                    'username': recipe.pop('author_username'),
+                }
+                stream.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+                total += 1
+                if total % chunk == 0:
+                    self.report(total, start)
+        self.report(total, start)
+
+    def report(self, total, start):
+        elapsed = time.perf_counter() - start
+        self.stderr.write(
+            f'{total} recipes exported, {total / max(elapsed, 1e-9):.0f}/s'
+        )
@@ -0,0 +1,155 @@
+import json
+import sys
+import time
+from contextlib import nullcontext
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.caching import INGREDIENTS, RECIPES, bump_generations
+from api.images import schedule_renditions
+from api.management.commands.repair_counters import actual_count
+from api.models import FeedEntry, Ingredient, Recipe, RecipeComponent, Tag
+from users.models import User
+
+RecipeTag = Recipe.tags.through
+
+
+class Command(BaseCommand):
+    help = ('Load recipes from NDJSON made by export_recipes. Every chunk is '
+            'inserted with bulk_create in its own transaction; unknown '
+            'authors and ingredients are created, unknown tags skipped. '
+            'Imported recipes are put to the followers\' feeds, and their '
+            'image renditions are rendered in the background before the '
+            'command exits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='NDJSON file, "-" for stdin.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit')
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.skipped_tags = 0
+        source = (nullcontext(sys.stdin) if options['input'] == '-'
+                  else open(options['input'], encoding='utf-8'))
+        start = time.perf_counter()
+        total = 0
+        with source as lines:
+            records = (json.loads(line) for line in lines if line.strip())
+            while True:
+                chunk = list(islice(records, options['chunk_size']))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    scopes = self.import_chunk(chunk)
+                # Сбрасываем кэши после каждого чанка: если импорт упадёт,
+                # уже записанные чанки не останутся невидимыми
+                bump_generations(*scopes)
+                total += len(chunk)
+                elapsed = time.perf_counter() - start
+                self.stderr.write(
+                    f'{total} recipes imported, '
+                    f'{total / max(elapsed, 1e-9):.0f}/s'
+                )
+        if self.skipped_tags:
+            self.stderr.write(f'{self.skipped_tags} unknown tags skipped')
+
+    def import_chunk(self, chunk):
+        """Insert the chunk, return cache scopes to bump after commit."""
+        authors = self.resolve_authors(chunk)
+        scopes = [RECIPES]
+        if self.resolve_ingredients(chunk):
+            scopes.append(INGREDIENTS)
+        recipes = [
+            Recipe(
+                name=record['name'], text=record.get('text'),
+                cooking_time=record['cooking_time'],
+                image=record.get('image') or None,
+                author_id=authors[record['author']['email']]
+            ) for record in chunk
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            # Без RETURNING у bulk_create не будет id новых рецептов
+            for recipe in recipes:
+                recipe.save()
+        components, tags = [], []
+        for recipe, record in zip(recipes, chunk):
+            components.extend(
+                RecipeComponent(
+                    recipe=recipe, amount=item['amount'],
+                    ingredient_id=self.ingredients[
+                        item['name'], item['measurement_unit']
+                    ]
+                ) for item in record['ingredients']
+            )
+            for slug in record['tags']:
+                if slug in self.tags:
+                    tags.append(
+                        RecipeTag(recipe=recipe, tag_id=self.tags[slug])
+                    )
+                else:
+                    self.skipped_tags += 1
+        RecipeComponent.objects.bulk_create(components)
+        RecipeTag.objects.bulk_create(tags)
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes]
+        ).refresh_search_vectors()
+        User.objects.filter(pk__in=set(authors.values())).update(
+            recipes_count=actual_count(Recipe, 'author')
+        )
+        FeedEntry.objects.fan_out_many(recipes)
+        for recipe in recipes:
+            schedule_renditions(recipe)
+        return scopes
+
+    def resolve_authors(self, chunk):
+        refs = {record['author']['email']: record['author'] for record in chunk}
+        authors = dict(
+            User.objects.filter(email__in=refs).values_list('email', 'pk')
+        )
+        missing = [ref for email, ref in refs.items() if email not in authors]
+        if missing:
+            User.objects.bulk_create(
+                (User(email=ref['email'],
+                      username=ref.get('username') or ref['email'],
+                      password=make_password(None)) for ref in missing),
+                ignore_conflicts=True
+            )
+            authors = dict(User.objects.filter(
+                email__in=refs
+            ).values_list('email', 'pk'))
+        if len(authors) < len(refs):
+            raise CommandError(
+                'Could not create authors: %s'
+                % ', '.join(sorted(set(refs) - set(authors)))
+            )
+        return authors
+
+    def resolve_ingredients(self, chunk):
+        missing = {
+            (item['name'], item['measurement_unit'])
+            for record in chunk for item in record['ingredients']
+        } - self.ingredients.keys()
+        if not missing:
+            return False
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing),
+            ignore_conflicts=True
+        )
+        names = {name for name, _ in missing}
+        self.ingredients.update(
+            ((name, unit), pk) for pk, name, unit in
+            Ingredient.objects.filter(name__in=names).values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        )
+        return True
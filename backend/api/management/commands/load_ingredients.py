@@ -0,0 +1,80 @@
+import csv
+import io
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.caching import INGREDIENTS, bump_generations
+from api.models import Ingredient
+
+COPY_SQL = """
+    CREATE TEMP TABLE ingredients_load (name text, measurement_unit text)
+    ON COMMIT DROP
+"""
+UPSERT_SQL = """
+    INSERT INTO {table} (name, measurement_unit)
+    SELECT DISTINCT name, measurement_unit FROM ingredients_load
+    ON CONFLICT (name, measurement_unit) DO NOTHING
+"""
+
+
+class Command(BaseCommand):
+    help = ('Load the ingredient catalog from CSV (name,measurement_unit). '
+            'Rows already in the database are skipped, so the command can '
+            'be re-run after the catalog is updated.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Use bulk_create even on Postgres.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with open(options['path'], encoding='utf-8') as source:
+            rows = list(dict.fromkeys(
+                (name.strip(), unit.strip())
+                for name, unit in csv.reader(source)
+            ))
+        with transaction.atomic():
+            if connection.vendor == 'postgresql' and not options['no_copy']:
+                created = self.copy(rows)
+            else:
+                created = self.bulk_insert(rows, options['batch_size'])
+        if created:
+            bump_generations(INGREDIENTS)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{len(rows)} rows read, {created} created in {elapsed:.2f} s '
+            f'({len(rows) / max(elapsed, 1e-9):.0f} rows/s)'
+        )
+
+    def copy(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(COPY_SQL)
+            cursor.copy_expert(
+                'COPY ingredients_load FROM STDIN WITH (FORMAT csv)', buffer
+            )
+            cursor.execute(
+                UPSERT_SQL.format(table=Ingredient._meta.db_table)
+            )
+            return cursor.rowcount
+
+    def bulk_insert(self, rows, batch_size):
+        # Строки, вставленные параллельно, отсекает уникальный индекс
+        before = Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in rows),
+            batch_size=batch_size, ignore_conflicts=True
+        )
+        return Ingredient.objects.count() - before
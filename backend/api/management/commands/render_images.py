@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.db.models.fields.json import KeyTextTransform
+
+from api.images import render_renditions
+from api.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Render image renditions of recipes which have none or whose '
+            'image changed since, e.g. after a deploy or a failed worker.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', help='Re-render every recipe.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(Q(image='') | Q(image__isnull=True))
+        if not options['all']:
+            # Сравниваем как текст: у рецепта без рендеров source нет
+            # вовсе, а сравнение с NULL в exclude() отбросило бы его
+            recipes = recipes.annotate(
+                source=KeyTextTransform('source', 'renditions')
+            ).filter(Q(source__isnull=True) | ~Q(source=F('image')))
+        # Без iterator(): render_renditions() закрывает соединение с базой
+        pending = list(recipes.values_list('pk', 'image'))
+        for pk, name in pending:
+            render_renditions(pk, name)
+        self.stdout.write(f'{len(pending)} recipes rendered')
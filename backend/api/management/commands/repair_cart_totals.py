@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from api.models import ShoppingCartIngredient
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Recompute aggregated shopping cart ingredients from the '
+            'recipes in the carts and fix the ones that drifted, one user '
+            'primary key range per transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch = options['batch_size']
+        start_time = time.perf_counter()
+        last_pk = User.objects.aggregate(last=Max('pk'))['last'] or 0
+        repaired = 0
+        for start in range(0, last_pk + 1, batch):
+            with transaction.atomic():
+                repaired += ShoppingCartIngredient.objects.rebuild(
+                    User.objects.filter(
+                        pk__gte=start, pk__lt=start + batch
+                    ).values_list('pk', flat=True)
+                )
+        self.stdout.write(
+            f'cart totals: {repaired} repaired '
+            f'in {time.perf_counter() - start_time:.2f} s'
+        )
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.models import FavorRecipes, Recipe, ShoppingList
+from users.models import Follow, User
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+    (Recipe, 'favorites_count', FavorRecipes, 'recipes'),
+    (Recipe, 'carts_count', ShoppingList, 'recipes'),
+)
+
+
+def actual_count(source, fk):
+    return Coalesce(Subquery(
+        source.objects.filter(**{fk: OuterRef('pk')}).order_by().values(
+            fk
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Recompute denormalized counters of users and recipes and fix '
+            'the ones that drifted, one primary key range per transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        batch = options['batch_size']
+        for model, field, source, fk in COUNTERS:
+            start_time = time.perf_counter()
+            expected = actual_count(source, fk)
+            last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+            repaired = 0
+            for start in range(0, last_pk + 1, batch):
+                with transaction.atomic():
+                    repaired += model.objects.filter(
+                        pk__gte=start, pk__lt=start + batch
+                    ).exclude(**{field: expected}).update(**{field: expected})
+            self.stdout.write(
+                f'{model._meta.model_name}.{field}: {repaired} repaired '
+                f'in {time.perf_counter() - start_time:.2f} s'
+            )
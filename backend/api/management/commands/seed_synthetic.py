@@ -0,0 +1,246 @@
+import random
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Sum
+
+from api.caching import RECIPES, bump_generations
+from api.models import (FavorRecipes, FeedEntry, Ingredient, Recipe,
+                        RecipeComponent, ShoppingCartIngredient, ShoppingList,
+                        Tag)
+from users.models import Follow, User
+
+# Те же тэги, что создаёт миграция 0002_data
+TAGS = (
+    ('Завтрак', '#FFB240', 'breakfast'),
+    ('Обед', '#FF8040', 'supper'),
+    ('Ланч', '#00AA72', 'lunch'),
+    ('Ужин', '#4188D2', 'dinner'),
+)
+SENTENCES = (
+    'Нарежьте все ингредиенты небольшими кубиками.',
+    'Доведите до кипения и варите на медленном огне.',
+    'Обжарьте на сливочном масле до золотистой корочки.',
+    'Посолите и поперчите по вкусу.',
+    'Выложите в форму и запекайте при 180 градусах.',
+    'Перед подачей посыпьте зеленью.',
+)
+
+
+class Zipf:
+    """Draw items with probability proportional to 1 / rank ** exponent."""
+
+    def __init__(self, rnd, items, exponent):
+        self.rnd = rnd
+        self.items = list(items)
+        rnd.shuffle(self.items)
+        self.weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+
+    def choice(self):
+        position = bisect_left(
+            self.weights, self.rnd.random() * self.weights[-1]
+        )
+        return self.items[position]
+
+    def sample(self, count, exclude=None):
+        """Return up to count distinct items.
+
+        Rare items take many draws, so at most half of them are sampled.
+        """
+        count = min(count, len(self.items) // 2)
+        found = set()
+        while len(found) < count:
+            item = self.choice()
+            if item != exclude:
+                found.add(item)
+        return found
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ('Generate users, recipes, follows, favorites and shopping carts '
+            'for load testing. Ingredients, tags, authors and recipes are '
+            'picked with power-law popularity, the same --seed gives the '
+            'same data. Denormalized counters, cart totals, feeds and search '
+            'vectors are filled afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--components', type=int, default=8,
+                            help='mean number of ingredients per recipe')
+        parser.add_argument('--follows', type=int, default=10,
+                            help='mean number of follows per user')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='mean number of favorites per user')
+        parser.add_argument('--carts', type=int, default=3,
+                            help='mean number of recipes in a cart')
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='power-law exponent of popularity')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rnd = random.Random(options['seed'])
+        self.batch = options['batch_size']
+        call_command('load_ingredients', stdout=self.stdout)
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        users = self.stage('users', self.create_users)
+        recipes = self.stage('recipes', self.create_recipes, users)
+        self.stage('components and tags', self.create_components, recipes)
+        self.stage('follows', self.create_pairs, Follow, 'user', 'author',
+                   users, users, options['follows'])
+        self.stage('favorites', self.create_pairs, FavorRecipes, 'author',
+                   'recipes', users, recipes, options['favorites'])
+        self.stage('carts', self.create_pairs, ShoppingList, 'author',
+                   'recipes', users, recipes, options['carts'])
+        call_command('repair_counters', stdout=self.stdout)
+        self.stage('cart totals', self.fill_cart_totals, users)
+        self.stage('feeds', self.fill_feeds, users)
+        self.stage('search vectors', self.fill_search_vectors, recipes)
+        bump_generations(RECIPES)
+
+    def stage(self, title, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        self.stdout.write(
+            f'{title}: {time.perf_counter() - start:.2f} s'
+        )
+        return result
+
+    def heavy_tail(self, mean, cap):
+        """Random count with the given mean and a Pareto tail, may be 0."""
+        return min(cap, round(mean * (self.rnd.paretovariate(2) - 1)))
+
+    def new_pks(self, model, create):
+        """Run create() and return primary keys of the rows it added."""
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        create()
+        return list(model.objects.filter(pk__gt=last).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        offset = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(None)
+        rows = (
+            User(username=f'{prefix}_{num}', first_name='Синтетический',
+                 last_name=f'Пользователь {num}', password=password,
+                 email=f'{prefix}_{num}@foodgram.local')
+            for num in range(offset, offset + self.options['users'])
+        )
+        return self.new_pks(User, lambda: self.insert(User, rows))
+
+    def create_recipes(self, users):
+        authors = Zipf(self.rnd, users, self.options['exponent'])
+        rows = (
+            Recipe(
+                author_id=authors.choice(),
+                name=f'Рецепт {num}',
+                text=' '.join(self.rnd.choices(
+                    SENTENCES, k=self.rnd.randint(2, 12)
+                )),
+                cooking_time=self.rnd.randint(5, 180)
+            )
+            for num in range(self.options['recipes'])
+        )
+        return self.new_pks(Recipe, lambda: self.insert(Recipe, rows))
+
+    def create_components(self, recipes):
+        ingredients = Zipf(
+            self.rnd, Ingredient.objects.values_list('pk', flat=True),
+            self.options['exponent']
+        )
+        tags = Zipf(self.rnd, Tag.objects.values_list('pk', flat=True), 1)
+        self.insert(RecipeComponent, (
+            RecipeComponent(recipe_id=recipe, ingredient_id=ingredient,
+                            amount=self.rnd.randint(1, 500))
+            for recipe in recipes
+            for ingredient in ingredients.sample(
+                max(1, self.heavy_tail(self.options['components'], 50))
+            )
+        ))
+        self.insert(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in tags.sample(self.rnd.randint(1, 2))
+        ))
+
+    def create_pairs(self, model, owner, target, owners, targets, mean):
+        popular = Zipf(self.rnd, targets, self.options['exponent'])
+        exclude = owners is targets
+        self.insert(model, (
+            model(**{f'{owner}_id': pk, f'{target}_id': item})
+            for pk in owners
+            for item in popular.sample(
+                self.heavy_tail(mean, 1000), exclude=pk if exclude else None
+            )
+        ), ignore_conflicts=True)
+
+    def fill_cart_totals(self, users):
+        for chunk in chunked(users, self.batch):
+            totals = RecipeComponent.objects.filter(
+                recipe__shop_list__author__in=chunk
+            ).order_by().values(
+                'recipe__shop_list__author', 'ingredient'
+            ).annotate(total=Sum('amount'))
+            ShoppingCartIngredient.objects.bulk_create(
+                (ShoppingCartIngredient(
+                    user_id=row['recipe__shop_list__author'],
+                    ingredient_id=row['ingredient'], amount=row['total']
+                ) for row in totals.iterator()),
+                batch_size=self.batch, ignore_conflicts=True
+            )
+
+    def fill_feeds(self, users):
+        # Авторы-миллионники в ленту не раскладываются, см. RecipeQuerySet
+        for chunk in chunked(users, self.batch):
+            follows = list(Follow.objects.filter(
+                user__in=chunk,
+                author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+            ).values_list('user_id', 'author_id'))
+            latest = defaultdict(list)
+            for authors in chunked({pk for _, pk in follows}, 500):
+                for recipe in Recipe.objects.latest_by_authors(
+                    authors, settings.FEED_BACKFILL
+                ):
+                    latest[recipe.author_id].append(recipe.pk)
+            self.insert(FeedEntry, (
+                FeedEntry(user_id=user, author_id=author, recipe_id=recipe)
+                for user, author in follows
+                for recipe in latest[author]
+            ), ignore_conflicts=True)
+
+    def fill_search_vectors(self, recipes):
+        for chunk in chunked(recipes, self.batch):
+            Recipe.objects.filter(
+                pk__gte=chunk[0], pk__lte=chunk[-1]
+            ).refresh_search_vectors()
+
+    def insert(self, model, rows, **kwargs):
+        for chunk in chunked(rows, self.batch):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, **kwargs)
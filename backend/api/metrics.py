@@ -0,0 +1,417 @@
+"""Per-request performance metrics.
+
+MetricsMiddleware measures every request: SQL query count and time, cache
+time with payload cache hits and misses, serialization time and the total
+time. Serialization covers the recipe serializers and the rendering of
+every DRF response, without the SQL and cache calls made meanwhile. The
+remainder of the total ("app") is the rest of the Python code: routing,
+authentication, permissions and views. The numbers are sent in the
+Server-Timing header and added to histograms per URL pattern name, exposed
+in Prometheus text format by metrics_view.
+
+With the Redis cache the series are kept in Redis, so one scrape covers
+all workers; other cache backends keep them in the process.
+
+The middleware works under WSGI and ASGI. Queries are counted by a wrapper
+added to every database connection, since async views run them in pool
+threads with connections of their own.
+"""
+import asyncio
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+from django_redis import get_redis_connection
+from redis import RedisError
+
+logger = logging.getLogger(__name__)
+
+current = ContextVar('request_metrics', default=None)
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.cache = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.serialize = 0.0
+        self.serializing = 0
+        self.serialize_start = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        """Time one query, see count_query()."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def own_time(self):
+        """Wall time minus SQL and cache time spent so far."""
+        return time.perf_counter() - self.db - self.cache
+
+    def start_serialize(self):
+        # Вложенные вызовы (сериализатор внутри сериализатора) не
+        # считаются повторно
+        self.serializing += 1
+        if self.serializing == 1:
+            self.serialize_start = self.own_time()
+
+    def stop_serialize(self):
+        self.serializing -= 1
+        if not self.serializing:
+            self.serialize += self.own_time() - self.serialize_start
+
+    def server_timing(self):
+        total = time.perf_counter() - self.start
+        app = max(total - self.db - self.cache - self.serialize, 0)
+        return ', '.join((
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"',
+            f'cache;dur={self.cache * 1000:.2f};'
+            f'desc="{self.hits} hits, {self.misses} misses"',
+            f'serialize;dur={self.serialize * 1000:.2f}',
+            f'app;dur={app * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+
+
+def count_query(execute, sql, params, many, context):
+    """Database execute wrapper adding queries to the current request."""
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def watch_connection(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@contextmanager
+def cache_timer():
+    """Add the time spent in the block to the current request's cache."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = current.get()
+        if metrics is not None:
+            metrics.cache += time.perf_counter() - start
+
+
+@contextmanager
+def serialize_timer():
+    """Add the time spent in the block to the current request's serialize.
+
+    Works as a decorator of to_representation() too.
+    """
+    metrics = current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.start_serialize()
+    try:
+        yield
+    finally:
+        metrics.stop_serialize()
+
+
+def count_cache(hit):
+    metrics = current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.hits += 1
+    else:
+        metrics.misses += 1
+
+
+class LocalStorage:
+    """Series of the current process, used when the cache is not Redis."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = defaultdict(dict)
+
+    def add(self, updates):
+        with self.lock:
+            for name, field, value in updates:
+                series = self.data[name]
+                series[field] = series.get(field, 0) + value
+
+    def read(self, name):
+        with self.lock:
+            return dict(self.data[name])
+
+
+class RedisStorage:
+    """Series shared by all workers, a Redis hash per metric."""
+
+    key = 'metrics:%s'
+
+    def __init__(self, client):
+        self.client = client
+
+    def add(self, updates):
+        pipeline = self.client.pipeline(transaction=False)
+        for name, field, value in updates:
+            if isinstance(value, int):
+                pipeline.hincrby(self.key % name, field, value)
+            else:
+                pipeline.hincrbyfloat(self.key % name, field, value)
+        pipeline.execute()
+
+    def read(self, name):
+        return {
+            field.decode(): int(value) if value.isdigit() else float(value)
+            for field, value in self.client.hgetall(self.key % name).items()
+        }
+
+
+def create_storage():
+    try:
+        return RedisStorage(get_redis_connection('default'))
+    except NotImplementedError:
+        return LocalStorage()
+
+
+storage = SimpleLazyObject(create_storage)
+
+
+class Metric(ABC):
+    """Metric whose series are kept in storage.
+
+    A series is stored as fields "<labels>|<part>" of the metric, where the
+    part is a bucket index or "sum" for histograms and "value" for
+    counters.
+    """
+
+    kind = None
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+
+    def update(self, labels, part, value):
+        return self.name, f'{labels}|{part}', value
+
+    def expose(self):
+        series = defaultdict(dict)
+        for field, value in storage.read(self.name).items():
+            labels, _, part = field.rpartition('|')
+            series[labels][part] = value
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for labels, values in sorted(series.items()):
+            lines.extend(self.samples(labels, values))
+        return lines
+
+    @abstractmethod
+    def samples(self, labels, values):
+        """Yield exposition lines of one series."""
+
+    @staticmethod
+    def format_labels(labels, **extra):
+        pairs = (f'{key}="{value}"' for key, value in extra.items())
+        return ','.join((labels, *pairs) if labels else pairs)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels, value=1):
+        """Return the storage update adding value to the series."""
+        return [self.update(labels, 'value', value)]
+
+    def samples(self, labels, values):
+        yield f'{self.name}{{{labels}}} {values.get("value", 0)}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, buckets):
+        super().__init__(name, description)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        """Return the storage updates recording one observation."""
+        return [
+            self.update(labels, bisect_left(self.buckets, value), 1),
+            self.update(labels, 'sum', float(value)),
+        ]
+
+    def samples(self, labels, values):
+        cumulative = 0
+        for index, bound in enumerate((*self.buckets, '+Inf')):
+            cumulative += values.get(str(index), 0)
+            yield (f'{self.name}_bucket{{'
+                   f'{self.format_labels(labels, le=bound)}}} {cumulative}')
+        yield f'{self.name}_sum{{{labels}}} {values.get("sum", 0)}'
+        yield f'{self.name}_count{{{labels}}} {cumulative}'
+
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds', 'Total request time.',
+    DURATION_BUCKETS
+)
+DB_DURATION = Histogram(
+    'foodgram_db_duration_seconds', 'Time spent in SQL queries.',
+    DURATION_BUCKETS
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries', 'SQL queries per request.', QUERY_BUCKETS
+)
+CACHE_DURATION = Histogram(
+    'foodgram_cache_duration_seconds', 'Time spent in cache calls.',
+    DURATION_BUCKETS
+)
+SERIALIZE_DURATION = Histogram(
+    'foodgram_serialize_duration_seconds',
+    'Time spent in serializers and rendering.', DURATION_BUCKETS
+)
+CACHE_HITS = Counter(
+    'foodgram_cache_hits_total', 'Responses served from the payload cache.'
+)
+CACHE_MISSES = Counter(
+    'foodgram_cache_misses_total', 'Responses missing in the payload cache.'
+)
+METRICS = (
+    REQUEST_DURATION, DB_DURATION, DB_QUERIES, CACHE_DURATION,
+    SERIALIZE_DURATION, CACHE_HITS, CACHE_MISSES,
+)
+
+
+def record(metrics, labels):
+    """Add the request to all metrics with one storage call."""
+    labels = Metric.format_labels('', **labels)
+    updates = [
+        *REQUEST_DURATION.observe(
+            labels, time.perf_counter() - metrics.start
+        ),
+        *DB_DURATION.observe(labels, metrics.db),
+        *DB_QUERIES.observe(labels, metrics.queries),
+        *CACHE_DURATION.observe(labels, metrics.cache),
+        *SERIALIZE_DURATION.observe(labels, metrics.serialize),
+    ]
+    if metrics.hits:
+        updates.extend(CACHE_HITS.inc(labels, metrics.hits))
+    if metrics.misses:
+        updates.extend(CACHE_MISSES.inc(labels, metrics.misses))
+    try:
+        storage.add(updates)
+    except RedisError:
+        # Недоступный Redis не должен ронять сам запрос
+        logger.exception('Failed to record request metrics')
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как MiddlewareMixin: под ASGI middleware сам корутина
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        labels = self.get_labels(request)
+        if self.finish(response, metrics, labels):
+            record(metrics, labels)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        labels = self.get_labels(request)
+        if self.finish(response, metrics, labels):
+            # Запись в Redis не должна блокировать цикл событий
+            await sync_to_async(record, thread_sensitive=False)(
+                metrics, labels
+            )
+        return response
+
+    def get_labels(self, request):
+        match = request.resolver_match
+        return {
+            'view': match.view_name if match else 'unmatched',
+            'method': request.method,
+        }
+
+    def finish(self, response, metrics, labels):
+        """Add Server-Timing, return True if metrics can be recorded now."""
+        response['Server-Timing'] = metrics.server_timing()
+        if response.streaming:
+            # Запросы потокового ответа выполняются уже после возврата
+            # из middleware: в заголовок они не попадут, а в гистограммы
+            # досчитываем их по мере отдачи
+            response.streaming_content = self.stream(
+                response.streaming_content, metrics, labels
+            )
+            return False
+        return True
+
+    def process_template_response(self, request, response):
+        """Time rendering of DRF responses as serialization."""
+        metrics = current.get()
+        if metrics is not None:
+            metrics.start_serialize()
+            response.add_post_render_callback(
+                lambda rendered: metrics.stop_serialize()
+            )
+        return response
+
+    def stream(self, content, metrics, labels):
+        # Генератор могут закрыть в другом контексте, поэтому без reset()
+        current.set(metrics)
+        try:
+            yield from content
+        finally:
+            current.set(None)
+            record(metrics, labels)
+
+
+def metrics_view(request):
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    return HttpResponse(
+        '\n'.join(lines) + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,58 @@
+# Generated by Django 3.1.12 on 2026-10-18 04:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_cart_totals(apps, schema_editor):
+    """Aggregate ingredients of recipes already put in shopping carts."""
+
+    RecipeComponent = apps.get_model('api', 'RecipeComponent')
+    ShoppingCartIngredient = apps.get_model('api', 'ShoppingCartIngredient')
+    totals = RecipeComponent.objects.values(
+        'recipe__shop_list__author', 'ingredient'
+    ).filter(recipe__shop_list__isnull=False).annotate(total=Sum('amount'))
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(
+            user_id=row['recipe__shop_list__author'],
+            ingredient_id=row['ingredient'],
+            amount=row['total']
+        ) for row in totals.order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0005_auto_20210829_1837'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='text',
+            field=models.TextField(null=True, verbose_name='Текст'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingCartIngredient',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to='api.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в корзине',
+                'verbose_name_plural': 'Ингредиенты в корзине',
+                'ordering': ('pk',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='cart_user_ingredient_unique'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.1.12 on 2026-10-18 04:23
+
+from django.conf import settings
+import django.contrib.postgres.search
+from django.db import migrations
+
+# to_tsvector и GIN есть только в Postgres, на остальных базах
+# RecipeQuerySet.search() работает через LIKE и вектор не нужен.
+CREATE_INDEX = (
+    'CREATE INDEX api_recipe_search_vector_gin '
+    'ON api_recipe USING gin (search_vector)'
+)
+DROP_INDEX = 'DROP INDEX IF EXISTS api_recipe_search_vector_gin'
+FILL_VECTORS = """
+    UPDATE api_recipe SET search_vector =
+        setweight(to_tsvector(%(config)s, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce(text, '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(i.name, ' ')
+            FROM api_recipecomponent c
+            JOIN api_ingredient i ON i.id = c.ingredient_id
+            WHERE c.recipe_id = api_recipe.id
+        ), '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        FILL_VECTORS, params={'config': settings.SEARCH_CONFIG}
+    )
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.12 on 2026-10-18 04:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('users.User', 'recipes_count', 'api.Recipe', 'author'),
+    ('users.User', 'followers_count', 'users.Follow', 'author'),
+    ('api.Recipe', 'favorites_count', 'api.FavorRecipes', 'recipes'),
+    ('api.Recipe', 'carts_count', 'api.ShoppingList', 'recipes'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    """Count existing rows, later on signals keep the counters."""
+
+    for model, field, source, fk in COUNTERS:
+        total = apps.get_model(source).objects.filter(**{fk: OuterRef('pk')}).order_by(
+        ).values(fk).annotate(total=Count('pk')).values('total')
+        apps.get_model(model).objects.update(
+            **{field: Coalesce(Subquery(total), 0)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_recipe_search_vector'),
+        ('users', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.1.12 on 2026-10-18 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    """Put latest recipes of already followed authors to the feeds."""
+
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('api', 'Recipe')
+    FeedEntry = apps.get_model('api', 'FeedEntry')
+    for follow in Follow.objects.iterator():
+        recipes = Recipe.objects.filter(
+            author_id=follow.author_id
+        ).order_by('-pk').values_list('pk', flat=True)
+        FeedEntry.objects.bulk_create(
+            FeedEntry(user_id=follow.user_id, recipe_id=recipe_id,
+                      author_id=follow.author_id)
+            for recipe_id in recipes[:settings.FEED_BACKFILL]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='api.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Лента подписок',
+                'ordering': ('-recipe',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='feed_user_recipe_unique'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
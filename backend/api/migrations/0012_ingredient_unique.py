@@ -0,0 +1,61 @@
+# Generated by Django 3.1.12 on 2026-10-18 04:58
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.utils import timezone
+
+# Строки, ссылающиеся на ингредиент, и поле, уникальное вместе с ним
+REFERENCES = (
+    ('RecipeComponent', 'recipe_id'),
+    ('ShoppingCartIngredient', 'user_id'),
+)
+
+
+def merge_duplicates(apps, schema_editor):
+    """Point references of duplicate ingredients to the oldest one."""
+    Ingredient = apps.get_model('api', 'Ingredient')
+    Recipe = apps.get_model('api', 'Recipe')
+    touched = set()
+    groups = Ingredient.objects.order_by().values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('pk'), total=Count('pk')).filter(total__gt=1)
+    for group in groups:
+        duplicates = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=group['keep']).values_list('pk', flat=True))
+        for model_name, owner in REFERENCES:
+            model = apps.get_model('api', model_name)
+            kept = {
+                getattr(row, owner): row
+                for row in model.objects.filter(ingredient_id=group['keep'])
+            }
+            for row in model.objects.filter(ingredient_id__in=duplicates):
+                if model_name == 'RecipeComponent':
+                    touched.add(row.recipe_id)
+                target = kept.get(getattr(row, owner))
+                if target is None:
+                    row.ingredient_id = group['keep']
+                    row.save(update_fields=['ingredient'])
+                    kept[getattr(row, owner)] = row
+                else:
+                    target.amount += row.amount
+                    target.save(update_fields=['amount'])
+                    row.delete()
+        Ingredient.objects.filter(pk__in=duplicates).delete()
+    # Кэшированные фрагменты этих рецептов держат старые ингредиенты
+    Recipe.objects.filter(pk__in=touched).update(modified=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_recipe_modified'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='ingredient_name_unit_unique'),
+        ),
+    ]
@@ -1,13 +1,30 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import Exists, F, OuterRef, Sum, Value
+from django.db import connection, models, transaction
+from django.db.models import (Case, Exists, F, OuterRef, Q, Subquery, Sum,
+                              Value, When)
+from django.dispatch import Signal
+from django.utils import timezone
+
+from users.models import Follow, User
 
-from users.models import User
+# Шлётся после массового добавления (step=1) или удаления (step=-1)
+# рецептов из избранного или корзины: построчные сигналы там не срабатывают.
+# Аргументы: user, recipe_ids, step.
+user_recipes_changed = Signal()
 
 
 class RecipeQuerySet(models.QuerySet):
     """A separate QS with annotated fields."""
 
+    # Порядок listed_by(), его сохраняет курсор KeysetPagination
+    listed_ordering = '-added'
+
     def opt_annotations(self, user):
         # По ошибке оставил qs, который дебажил - смысла в нем и не было:
         # подписчиками занимается соответствующая модель в users.models :)
@@ -29,6 +46,119 @@ class RecipeQuerySet(models.QuerySet):
             ))
         )
 
+    def latest_by_authors(self, author_ids, limit=None):
+        """Fetch up to `limit` newest recipes of every author in one query.
+
+        Django can't filter on a window function yet, so the ROW_NUMBER()
+        subquery is raw SQL. Only the columns of RecipeTinySerializer and
+        author_id are selected.
+        """
+        if not author_ids:
+            return []
+        columns = 'id, name, image, renditions, cooking_time, author_id'
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        sql = (
+            f'SELECT {columns} FROM (SELECT {columns}, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY id DESC) AS position '
+            f'FROM {self.model._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})) AS ranked'
+        )
+        params = list(author_ids)
+        if limit is not None:
+            sql += ' WHERE position <= %s'
+            params.append(limit)
+        return self.raw(sql + ' ORDER BY author_id, id DESC', params)
+
+    def feed(self, user):
+        """Recipes of the authors followed by the user.
+
+        Usually that's just user's FeedEntry rows. Authors with more than
+        FEED_FANOUT_LIMIT followers aren't fanned out and are pulled here.
+        """
+        pulled = list(Follow.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('author_id', flat=True))
+        if not pulled:
+            return self.filter(feed_entries__user=user)
+        return self.filter(
+            Q(pk__in=FeedEntry.objects.filter(user=user).values('recipe')) |
+            Q(author__in=pulled)
+        )
+
+    def listed_by(self, user, related_name):
+        """Recipes in the user's favorites or cart, latest added first.
+
+        The join starts from the user's rows found by the unique
+        (author, recipes) index, so only those recipes are read by primary
+        key. The list row's pk orders recipes by the time they were added.
+        """
+        return self.filter(**{f'{related_name}__author': user}).annotate(
+            added=F(f'{related_name}__pk')
+        ).order_by(self.listed_ordering)
+
+    def with_tags(self, tag_ids):
+        """Recipes having any of the tags, as an EXISTS semi-join.
+
+        Unlike filtering on the tags join it never duplicates a recipe
+        with several matching tags, so no DISTINCT is needed.
+        """
+        return self.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+        )))
+
+    def total_components(self):
+        """Return {ingredient_id: amount} summed over the recipes."""
+        return dict(
+            RecipeComponent.objects.filter(recipe__in=self).order_by().values(
+                'ingredient_id'
+            ).annotate(total=Sum('amount')).values_list(
+                'ingredient_id', 'total'
+            )
+        )
+
+    def touch(self):
+        """Move `modified` forward without save().
+
+        Tags and components are written without saving the recipe, its
+        cached fragments (see api.fragments) would stay current otherwise.
+        """
+        return self.update(modified=timezone.now())
+
+    def refresh_search_vectors(self):
+        """Rebuild full-text vectors of the recipes with a single UPDATE."""
+        if connection.vendor != 'postgresql':
+            return 0
+        config = settings.SEARCH_CONFIG
+        names = RecipeComponent.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=config) +
+            SearchVector('text', weight='B', config=config) +
+            SearchVector(Subquery(names), weight='C', config=config)
+        ))
+
+    def search(self, value):
+        """Search name, text and ingredient names ordering by relevance.
+
+        Postgres uses the maintained search_vector and its GIN index, other
+        backends (SQLite in tests) fall back to LIKE without ranking.
+        """
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(value, config=settings.SEARCH_CONFIG)
+            return self.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-pk')
+        return self.filter(
+            Q(name__icontains=value) | Q(text__icontains=value) |
+            Q(pk__in=RecipeComponent.objects.filter(
+                ingredient__name__icontains=value
+            ).values('recipe'))
+        )
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -44,6 +174,12 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('pk', )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='ingredient_name_unit_unique'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -81,6 +217,9 @@ class Recipe(models.Model):
         blank=True, null=True,
         verbose_name='Картинка рецепта'
     )
+    renditions = models.JSONField(
+        default=dict, editable=False, verbose_name='Уменьшенные копии'
+    )
     author = models.ForeignKey(
         User,
         related_name='recipes',
@@ -117,6 +256,18 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата создания'
     )
+    # Версия кэшированного фрагмента рецепта, см. api.fragments
+    modified = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В корзинах'
+    )
+    # GIN-индекс создаётся миграцией только на Postgres, см. 0007
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = RecipeQuerySet.as_manager()
 
@@ -128,6 +279,115 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name[:32]
 
+    def update_search_vector(self):
+        """Rebuild the full-text vector after recipe or its ingredients."""
+        Recipe.objects.filter(pk=self.pk).refresh_search_vectors()
+
+    def get_components(self):
+        """Return recipe ingredients as {ingredient_id: amount}."""
+        return dict(
+            self.component_recipes.values_list('ingredient_id', 'amount')
+        )
+
+
+class UserRecipesQuerySet(models.QuerySet):
+    """Set-based add and remove of recipes in a user's list.
+
+    Both run raw SQL on purpose: the statuses, counters and cart totals
+    must follow the rows the statement actually changed, which Postgres
+    reports with RETURNING. QuerySet.delete() would also send post_delete
+    per row and shift the counters twice.
+    """
+
+    def add_recipes(self, user, recipe_ids):
+        """Add recipes with a single INSERT.
+
+        Return {recipe_id: status}, status is 'added', 'exists' or
+        'not_found'.
+        """
+        results = dict.fromkeys(recipe_ids, 'not_found')
+        with transaction.atomic():
+            found = list(Recipe.objects.filter(
+                pk__in=recipe_ids
+            ).values_list('pk', flat=True))
+            results.update(dict.fromkeys(found, 'exists'))
+            added = self.insert_rows(user, found) if found else []
+            results.update(dict.fromkeys(added, 'added'))
+            if added:
+                user_recipes_changed.send(
+                    sender=self.model, user=user, recipe_ids=added, step=1
+                )
+        return results
+
+    def remove_recipes(self, user, recipe_ids):
+        """Remove recipes with a single DELETE.
+
+        Return {recipe_id: status}, status is 'removed' or 'not_found'.
+        """
+        results = dict.fromkeys(recipe_ids, 'not_found')
+        with transaction.atomic():
+            removed = self.delete_rows(user, list(recipe_ids))
+            if removed:
+                user_recipes_changed.send(
+                    sender=self.model, user=user, recipe_ids=removed, step=-1
+                )
+        results.update(dict.fromkeys(removed, 'removed'))
+        return results
+
+    def insert_rows(self, user, recipe_ids):
+        """Insert the user's rows, return ids of the recipes inserted."""
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Строку, вставленную параллельно, ON CONFLICT пропустит,
+                # и в RETURNING она не попадёт
+                cursor.execute(
+                    f'INSERT INTO {table} (author_id, recipes_id) '
+                    f'SELECT %s, UNNEST(%s) '
+                    f'ON CONFLICT (author_id, recipes_id) DO NOTHING '
+                    f'RETURNING recipes_id',
+                    [user.pk, recipe_ids]
+                )
+                return [row[0] for row in cursor.fetchall()]
+            # Остальные базы (SQLite в тестах) пишущие транзакции не
+            # пересекают, а гонка без ignore_conflicts закончится ошибкой,
+            # а не неверными счётчиками
+            present = set(self.filter(
+                author=user, recipes__in=recipe_ids
+            ).values_list('recipes_id', flat=True))
+            added = [pk for pk in recipe_ids if pk not in present]
+            if added:
+                cursor.executemany(
+                    f'INSERT INTO {table} (author_id, recipes_id) '
+                    f'VALUES (%s, %s)',
+                    [(user.pk, pk) for pk in added]
+                )
+            return added
+
+    def delete_rows(self, user, recipe_ids):
+        """Delete the user's rows, return ids of the recipes deleted."""
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'DELETE FROM {table} '
+                    f'WHERE author_id = %s AND recipes_id = ANY(%s) '
+                    f'RETURNING recipes_id',
+                    [user.pk, recipe_ids]
+                )
+                return [row[0] for row in cursor.fetchall()]
+            removed = list(self.filter(
+                author=user, recipes__in=recipe_ids
+            ).values_list('recipes_id', flat=True))
+            if removed:
+                placeholders = ', '.join(['%s'] * len(removed))
+                cursor.execute(
+                    f'DELETE FROM {table} '
+                    f'WHERE author_id = %s AND recipes_id IN ({placeholders})',
+                    [user.pk, *removed]
+                )
+            return removed
+
 
 class ShoppingList(models.Model):
     recipes = models.ForeignKey(
@@ -143,6 +403,8 @@ class ShoppingList(models.Model):
         related_name='author'
     )
 
+    objects = UserRecipesQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Рецепт в корзине'
         verbose_name_plural = 'Рецепты в корзине'
@@ -173,6 +435,8 @@ class FavorRecipes(models.Model):
         verbose_name='Пользователь'
     )
 
+    objects = UserRecipesQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -188,19 +452,6 @@ class FavorRecipes(models.Model):
         return f'{self.recipes.name} в избранном у {self.author.username}'
 
 
-class RecipeComponentQuerySet(models.QuerySet):
-    """Annotate the shoplist with Sum and ingredient fields."""
-
-    def shop_list(self, user):
-        qs = self.filter(recipe__shop_list__author=user).values(
-            'ingredient', 'ingredient__name', 'ingredient__measurement_unit'
-        ).order_by('ingredient').annotate(
-            sum=Sum('amount'), name=F('ingredient__name'),
-            unit=F('ingredient__measurement_unit')
-        )
-        return qs
-
-
 class RecipeComponent(models.Model):
     """Class for ingredient in recipe repr with add fields."""
 
@@ -223,8 +474,6 @@ class RecipeComponent(models.Model):
             message='Количество ингредиента не может быть меньше 1')]
     )
 
-    objects = RecipeComponentQuerySet.as_manager()
-
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
@@ -238,3 +487,207 @@ class RecipeComponent(models.Model):
 
     def __str__(self):
         return self.ingredient.name
+
+
+class ShoppingCartQuerySet(models.QuerySet):
+    """Keep aggregated ingredient amounts of users' shopping carts."""
+
+    def apply_delta(self, user_ids, delta):
+        """Add {ingredient_id: amount} to the carts of the given users.
+
+        Missing rows are inserted with zero amount first, so concurrent
+        writes only ever touch existing rows with a relative UPDATE. Rows
+        are never deleted: a row emptied by one transaction may already
+        have been found by another one, whose UPDATE would then be lost.
+        Emptied ingredients stay with zero amount, shop_list() skips them.
+        """
+        delta = {key: value for key, value in delta.items() if value}
+        user_ids = list(user_ids)
+        if not delta or not user_ids:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(user_id=user_id, ingredient_id=ingredient_id)
+                 for user_id in user_ids for ingredient_id in delta],
+                ignore_conflicts=True
+            )
+            rows = self.filter(user_id__in=user_ids, ingredient_id__in=delta)
+            rows.update(amount=F('amount') + Case(
+                *[When(ingredient_id=key, then=Value(value))
+                  for key, value in delta.items()],
+                output_field=models.IntegerField()
+            ))
+
+    def rebuild(self, user_ids):
+        """Recompute cart totals of the users from their shopping lists.
+
+        Return the number of rows fixed.
+        """
+        expected = {
+            (row['recipe__shop_list__author'], row['ingredient']):
+                row['total']
+            for row in RecipeComponent.objects.filter(
+                recipe__shop_list__author__in=user_ids
+            ).order_by().values(
+                'recipe__shop_list__author', 'ingredient'
+            ).annotate(total=Sum('amount'))
+        }
+        drifted = []
+        for row in self.filter(user_id__in=user_ids):
+            amount = expected.pop((row.user_id, row.ingredient_id), 0)
+            if row.amount != amount:
+                row.amount = amount
+                drifted.append(row)
+        self.bulk_update(drifted, ['amount'])
+        self.bulk_create(
+            [self.model(user_id=user_id, ingredient_id=ingredient_id,
+                        amount=amount)
+             for (user_id, ingredient_id), amount in expected.items()],
+            ignore_conflicts=True
+        )
+        return len(drifted) + len(expected)
+
+    def update_recipe(self, recipe, old_components, components=None):
+        """Propagate changed recipe components to the carts holding it."""
+        if components is None:
+            components = recipe.get_components()
+        delta = {
+            key: components.get(key, 0) - old_components.get(key, 0)
+            for key in components.keys() | old_components.keys()
+        }
+        users = recipe.shop_list.values_list('author_id', flat=True)
+        self.apply_delta(users, delta)
+
+    def shop_list(self, user):
+        return self.filter(
+            user=user, amount__gt=0
+        ).order_by('ingredient').values(
+            'amount', name=F('ingredient__name'),
+            unit=F('ingredient__measurement_unit')
+        )
+
+
+class ShoppingCartIngredient(models.Model):
+    """Total amount of an ingredient over all recipes in user's cart."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(default=0, verbose_name='Количество')
+
+    objects = ShoppingCartQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в корзине'
+        verbose_name_plural = 'Ингредиенты в корзине'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='cart_user_ingredient_unique'
+            )
+        ]
+        ordering = ('pk', )
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount}'
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    def fan_out(self, recipe):
+        """Push a new recipe to the feeds of its author's followers."""
+        if recipe.author.followers_count > settings.FEED_FANOUT_LIMIT:
+            return
+        followers = Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True)
+        self.bulk_create(
+            (self.model(user_id=user_id, recipe=recipe,
+                        author_id=recipe.author_id)
+             for user_id in followers.iterator()),
+            batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True
+        )
+
+    def fan_out_many(self, recipes):
+        """Push imported recipes to the feeds of their authors' followers.
+
+        Followers of all authors are read with one query.
+        """
+        by_author = defaultdict(list)
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe.pk)
+        followers = Follow.objects.filter(
+            author_id__in=by_author,
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).values_list('author_id', 'user_id')
+        self.bulk_create(
+            (self.model(user_id=user_id, recipe_id=recipe_id,
+                        author_id=author_id)
+             for author_id, user_id in followers.iterator()
+             for recipe_id in by_author[author_id]),
+            batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True
+        )
+
+    def backfill(self, follow):
+        """Put latest recipes of a newly followed author to the feed."""
+        if follow.author.followers_count > settings.FEED_FANOUT_LIMIT:
+            return
+        recipes = Recipe.objects.filter(
+            author_id=follow.author_id
+        ).values_list('pk', flat=True)[:settings.FEED_BACKFILL]
+        self.bulk_create(
+            [self.model(user_id=follow.user_id, recipe_id=recipe_id,
+                        author_id=follow.author_id) for recipe_id in recipes],
+            ignore_conflicts=True
+        )
+
+
+class FeedEntry(models.Model):
+    """Recipe of a followed author, written to the feed on publishing.
+
+    The unique (user, recipe) index also serves reading the feed newest
+    first as a backward range scan.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='feed_user_recipe_unique'
+            )
+        ]
+        ordering = ('-recipe', )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -1,5 +1,57 @@
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+
+from api.models import RecipeQuerySet
 
 
 class PageNumberPaginatorModified(PageNumberPagination):
     page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor over the primary key: no COUNT(*) and no OFFSET scans."""
+
+    ordering = '-pk'
+    page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        # Избранное и корзина упорядочены по времени добавления, см.
+        # RecipeQuerySet.listed_by(): такой порядок курсор сохраняет,
+        # любой другой заменяется на ordering
+        listed = (RecipeQuerySet.listed_ordering, )
+        if tuple(queryset.query.order_by) == listed:
+            return listed
+        return super().get_ordering(request, queryset, view)
+
+
+class OptionalKeysetPagination(BasePagination):
+    """Paginate by page numbers unless asked for ?pagination=cursor.
+
+    Links of a keyset page keep both query parameters, so the following
+    pages stay on the cursor.
+    """
+
+    ordering = '-pk'
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.keyset = KeysetPagination()
+        self.keyset.ordering = self.ordering
+        self.paginator = PageNumberPaginatorModified()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (params.get(self.mode_query_param) == 'cursor' or
+                self.keyset.cursor_query_param in params):
+            self.paginator = self.keyset
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class FollowKeysetPagination(OptionalKeysetPagination):
+    ordering = 'pk'
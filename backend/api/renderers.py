@@ -0,0 +1,74 @@
+"""Streaming renderers for the shopping list download.
+
+DRF picks a renderer by the `?format=` query parameter, the view then feeds
+rows from a database cursor to `stream()` chunk by chunk.
+"""
+import csv
+import json
+from abc import ABC, abstractmethod
+
+from rest_framework.renderers import BaseRenderer
+
+FIELDS = ('name', 'amount', 'unit')
+
+
+class Echo:
+    """File-like object returning whatever was written to it."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer, ABC):
+    charset = 'utf-8'
+
+    @abstractmethod
+    def stream(self, rows):
+        """Yield text chunks of the list for an iterable of row dicts."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Список отдаётся через stream(), сюда попадают только ошибки
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for item in rows:
+            yield f'{item["name"]} - {item["amount"]} {item["unit"]} \r\n'
+        yield '\r\n'
+        yield 'FoodGram, 2021'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(FIELDS)
+        for item in rows:
+            yield writer.writerow([item[field] for field in FIELDS])
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        separator = '['
+        for item in rows:
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+class NDJSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def stream(self, rows):
+        for item in rows:
+            yield json.dumps(item, ensure_ascii=False) + '\n'
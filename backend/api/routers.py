@@ -0,0 +1,61 @@
+"""Routers of the hot read endpoints.
+
+Under ASGI Django 3.1 runs every synchronous view on one shared thread of
+the worker, so requests waiting on Postgres or Redis queue behind each
+other. Django 3.1 has no async ORM or cache API either, so with
+ASYNC_VIEWS the views of AsyncRouter are coroutines awaiting the DRF view
+in the event loop's thread pool, like channels' database_sync_to_async.
+Under WSGI the views stay synchronous.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+from rest_framework.routers import SimpleRouter
+
+from api.metrics import serialize_timer
+
+
+def run_view(view, request, *args, **kwargs):
+    # Потоки пула живут дольше запроса: соединения закрываем сами, как это
+    # делает обработчик запроса в своём потоке
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        # Рендерим здесь же, а не в общем потоке обработчика
+        if callable(getattr(response, 'render', None)):
+            with serialize_timer():
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Turn a synchronous view into a coroutine running it in a pool."""
+    run = sync_to_async(
+        functools.partial(run_view, view), thread_sensitive=False
+    )
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncRouter(SimpleRouter):
+    """SimpleRouter with async views when ASYNC_VIEWS is on."""
+
+    def get_urls(self):
+        urls = super().get_urls()
+        if not settings.ASYNC_VIEWS:
+            return urls
+        return [
+            URLPattern(
+                url.pattern, async_view(url.callback), url.default_args,
+                url.name
+            ) for url in urls
+        ]
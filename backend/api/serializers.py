@@ -1,8 +1,16 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Manager
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.caching import INGREDIENTS, TAGS
+from api.catalog import CatalogPrimaryKeyField, catalog
+from api.fragments import get_fragments
+from api.images import RenditionsField
+from api.metrics import serialize_timer
 from api.models import (FavorRecipes, Ingredient, Recipe, RecipeComponent,
-                        ShoppingList, Tag)
+                        ShoppingCartIngredient, ShoppingList, Tag)
 from users.serializers import UserSerializer
 
 
@@ -54,13 +62,9 @@ class IngredientWriteSerializer(serializers.ModelSerializer):
         Условие исправил - лучше избегать неоднозначностей в коде. Сначала
         я сомневался, оставить-ли возможность нулевого количества, поскольку
         есть ингредиенты 'по вкусу', но их потом будет не посчитать в корзине.
+        Наличие ингредиентов в базе проверяется одним запросом для всего
+        списка в RecipeWriteSerializer.validate_ingredients().
         """
-        if not Ingredient.objects.filter(pk=attrs['id']).exists:
-            raise serializers.ValidationError(
-                {
-                    'ingredients': f'ингредиент с id {attrs["id"]} не найден'
-                },
-            )
         if int(attrs['amount']) < 1 or int(attrs['amount']) > 32766:
             raise serializers.ValidationError(
                 {
@@ -80,20 +84,12 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 class RecipeComponentSerializer(serializers.ModelSerializer):
-    id = serializers.SlugRelatedField(
-        source='ingredient',
-        slug_field='id',
-        queryset=Ingredient.objects.all()
-    )
-    name = serializers.SlugRelatedField(
-        source='ingredient',
-        slug_field='name',
-        read_only=True
-    )
-    measurement_unit = serializers.SlugRelatedField(
-        source='ingredient',
-        slug_field='measurement_unit',
-        read_only=True
+    """Read ingredient fields from the select_related instance."""
+
+    id = serializers.ReadOnlyField(source='ingredient_id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
     )
 
     class Meta:
@@ -104,11 +100,7 @@ class RecipeComponentSerializer(serializers.ModelSerializer):
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Recipe create-update ops serialize and validate."""
 
-    tags = serializers.SlugRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-        slug_field='id'
-    )
+    tags = CatalogPrimaryKeyField(TAGS, many=True)
     cooking_time = serializers.IntegerField()
     ingredients = IngredientWriteSerializer(many=True)
     author = UserSerializer(read_only=True)
@@ -140,35 +132,71 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         return attrs
 
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient['id'] for ingredient in ingredients]
+        duplicates = {pk for pk in ids if ids.count(pk) > 1}
+        if duplicates:
+            raise serializers.ValidationError(
+                f'Найден дублирующийся ингредиент id {min(duplicates)}'
+            )
+        missing = set(ids) - catalog.resolve(INGREDIENTS, ids).keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'ингредиент с id {min(missing)} не найден'
+            )
+        return ingredients
+
     def create_update_method(self, validated_data, recipe=None):
-        """Implement common method DRY for update(), create() actions."""
+        """Implement common method DRY for update(), create() actions.
+
+        Components are diffed against the existing ones, so an update
+        issues only the needed DELETE, UPDATE and INSERT statements.
+        """
         tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
+        components = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in validated_data.pop('ingredients')
+        }
+        existing = {}
         if recipe:
-            recipe.component_recipes.all().delete()
+            existing = {
+                component.ingredient_id: component
+                for component in recipe.component_recipes.all()
+            }
         else:
             recipe = Recipe.objects.create(**validated_data)
-        ingredient_instances = []
-        seen_ingredients = set()
-        for ingredient in ingredients:
-            id = ingredient['id']
-            if id in seen_ingredients:
-                raise serializers.ValidationError(
-                    f'Найден дублирующийся ингредиент id {id}'
-                )
-            seen_ingredients.add(id)
-            ingr_id = Ingredient.objects.get(pk=id)
-            amt = ingredient['amount']
-            ingredient_instances.append(
-                RecipeComponent(ingredient=ingr_id, recipe=recipe, amount=amt)
+        old_components = {
+            pk: component.amount for pk, component in existing.items()
+        }
+        removed = existing.keys() - components.keys()
+        if removed:
+            recipe.component_recipes.filter(
+                ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for pk, component in existing.items():
+            if pk in components and component.amount != components[pk]:
+                component.amount = components[pk]
+                changed.append(component)
+        RecipeComponent.objects.bulk_update(changed, ['amount'])
+        RecipeComponent.objects.bulk_create(
+            RecipeComponent(ingredient_id=pk, recipe=recipe, amount=amount)
+            for pk, amount in components.items() if pk not in existing
+        )
+        if old_components and old_components != components:
+            ShoppingCartIngredient.objects.update_recipe(
+                recipe, old_components, components
             )
-        RecipeComponent.objects.bulk_create(ingredient_instances)
         recipe.tags.set(tags)
         return recipe
 
+    @transaction.atomic
     def create(self, validated_data):
-        return self.create_update_method(validated_data)
+        recipe = self.create_update_method(validated_data)
+        recipe.update_search_vector()
+        return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance = self.create_update_method(validated_data, recipe=instance)
         instance.name = validated_data.pop('name')
@@ -177,6 +205,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             instance.image = validated_data.pop('image')
         instance.cooking_time = validated_data.pop('cooking_time')
         instance.save()
+        instance.update_search_vector()
         return instance
 
     def to_representation(self, instance):
@@ -188,22 +217,63 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ).data
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """Viewer-independent fields of a recipe, cached by api.fragments."""
+
     tags = TagSerializer(many=True, read_only=True)
-    author = UserSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField('get_ingredients')
-    is_favorited = serializers.BooleanField(read_only=True)
-    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+    images = RenditionsField()
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = (
+            'author', 'search_vector', 'favorites_count', 'carts_count',
+            'renditions', 'modified'
+        )
 
     def get_ingredients(self, recipe):
-        queryset = RecipeComponent.objects.filter(recipe=recipe)
+        # component_recipes приходят из prefetch в get_fragments(), без
+        # запроса на каждый рецепт
+        queryset = recipe.component_recipes.all()
         return RecipeComponentSerializer(queryset, many=True).data
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    @serialize_timer()
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        fragments = get_fragments(
+            recipes, RecipeFragmentSerializer, self.context
+        )
+        return [
+            self.child.merge(recipe, fragments[recipe.pk])
+            for recipe in recipes
+        ]
+
+
+class RecipeReadSerializer(serializers.ModelSerializer):
+    """Cached recipe fragment with the author and viewer's flags on top."""
+
+    author = UserSerializer(read_only=True)
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Recipe
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
+        list_serializer_class = RecipeListSerializer
+
+    @serialize_timer()
+    def to_representation(self, recipe):
+        fragments = get_fragments(
+            [recipe], RecipeFragmentSerializer, self.context
+        )
+        return self.merge(recipe, fragments[recipe.pk])
+
+    def merge(self, recipe, fragment):
+        return {**fragment, **super().to_representation(recipe)}
+
+
 class ShoppingSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -252,3 +322,13 @@ class FavorSerializer(serializers.ModelSerializer):
     class Meta:
         model = FavorRecipes
         fields = '__all__'
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Recipe ids of a bulk favorite or shopping cart request."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
@@ -1 +1,193 @@
-"""Invalidate cache on save-delete signals."""
+"""Invalidate cache and sync denormalized data on save-delete signals."""
+import logging
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from api.background import after_commit
+from api.caching import (INGREDIENTS, RECIPES, TAGS, bump_generations,
+                         user_scope)
+from api.images import schedule_renditions
+from api.models import (FavorRecipes, FeedEntry, Ingredient, Recipe,
+                        RecipeComponent, ShoppingCartIngredient, ShoppingList,
+                        Tag, user_recipes_changed)
+from users.models import Follow, User
+
+logger = logging.getLogger(__name__)
+
+
+def invalidate(*scopes):
+    """Bump generations once the current transaction is committed."""
+    transaction.on_commit(lambda: bump_generations(*scopes))
+
+
+def shift_counter(model, pks, field, step):
+    """Move denormalized counters with a single relative UPDATE."""
+    rows = model.objects.filter(pk__in=pks)
+    if step < 0:
+        rows = rows.filter(**{f'{field}__gte': -step})
+    rows.update(**{field: F(field) + step})
+
+
+def counter_receiver(sender, field, target, fk):
+    """Keep target.field equal to the number of sender rows pointing at it."""
+
+    def on_save(instance, created, **kwargs):
+        if created:
+            shift_counter(target, [getattr(instance, fk)], field, 1)
+
+    def on_delete(instance, **kwargs):
+        shift_counter(target, [getattr(instance, fk)], field, -1)
+
+    post_save.connect(on_save, sender=sender, weak=False)
+    post_delete.connect(on_delete, sender=sender, weak=False)
+
+
+counter_receiver(Recipe, 'recipes_count', User, 'author_id')
+counter_receiver(FavorRecipes, 'favorites_count', Recipe, 'recipes_id')
+counter_receiver(ShoppingList, 'carts_count', Recipe, 'recipes_id')
+counter_receiver(Follow, 'followers_count', User, 'author_id')
+
+LIST_COUNTERS = {FavorRecipes: 'favorites_count', ShoppingList: 'carts_count'}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, **kwargs):
+    invalidate(RECIPES)
+
+
+@receiver(post_save, sender=RecipeComponent)
+@receiver(post_delete, sender=RecipeComponent)
+def component_changed(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).touch()
+    invalidate(RECIPES)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if not reverse:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        # После очистки тэга его рецептов уже не найти
+        recipes = Recipe.objects.filter(tags=instance)
+    else:
+        recipes = Recipe.objects.filter(pk__in=pk_set or ())
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        recipes.touch()
+    if action.startswith('post_'):
+        invalidate(RECIPES)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    invalidate(TAGS, RECIPES)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    invalidate(INGREDIENTS, RECIPES)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if created:
+        return
+    Recipe.objects.filter(ingredients=instance).refresh_search_vectors()
+
+
+@receiver(post_save, sender=FavorRecipes)
+@receiver(post_delete, sender=FavorRecipes)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+def user_list_changed(sender, instance, **kwargs):
+    invalidate(user_scope(instance.author_id))
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_cart_totals(sender, instance, created, **kwargs):
+    if created:
+        ShoppingCartIngredient.objects.apply_delta(
+            [instance.author_id], instance.recipes.get_components()
+        )
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remove_from_cart_totals(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его компоненты ещё в базе
+    components = instance.recipes.get_components()
+    ShoppingCartIngredient.objects.apply_delta(
+        [instance.author_id],
+        {key: -value for key, value in components.items()}
+    )
+
+
+@receiver(user_recipes_changed)
+def user_recipes_bulk_changed(sender, user, recipe_ids, step, **kwargs):
+    shift_counter(Recipe, recipe_ids, LIST_COUNTERS[sender], step)
+    invalidate(user_scope(user.id))
+
+
+@receiver(user_recipes_changed, sender=ShoppingList)
+def bulk_cart_totals(sender, user, recipe_ids, step, **kwargs):
+    components = Recipe.objects.filter(pk__in=recipe_ids).total_components()
+    ShoppingCartIngredient.objects.apply_delta(
+        [user.id], {key: value * step for key, value in components.items()}
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    invalidate(user_scope(instance.user_id))
+
+
+def publish_recipe(recipe_id):
+    try:
+        recipe = Recipe.objects.select_related('author').filter(
+            pk=recipe_id
+        ).first()
+        if recipe is not None:
+            FeedEntry.objects.fan_out(recipe)
+    except Exception:
+        logger.exception('Failed to publish recipe %s to feeds', recipe_id)
+    finally:
+        connection.close()
+
+
+@receiver(post_save, sender=Recipe)
+def publish_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        after_commit(publish_recipe, instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def render_images(sender, instance, **kwargs):
+    schedule_renditions(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_feed(sender, instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def unfollow_feed(sender, instance, **kwargs):
+    FeedEntry.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id
+    ).delete()
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    # Авторизация обновляет только last_login - в выдачу он не попадает
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate(RECIPES)
@@ -0,0 +1,81 @@
+import pytest
+from cachalot.api import cachalot_disabled
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from api.models import Ingredient, Recipe, RecipeComponent, Tag
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(settings):
+    # Без redis и cachalot: каждый тест начинает с пустого кэша, а
+    # запросы доходят до базы. CACHALOT_ENABLED cachalot читает один раз
+    # при старте, поэтому выключаем его контекстным менеджером
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    cache.clear()
+    with cachalot_disabled():
+        yield
+    cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        username='cook', email='cook@foodgram.local', password='password'
+    )
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def anonymous():
+    return APIClient()
+
+
+@pytest.fixture
+def make_recipes(db, user):
+    """Create recipes of several authors, each with tags and components."""
+
+    def make(count, components=3):
+        authors = [user] + [
+            User.objects.create_user(
+                username=f'author_{num}', email=f'author_{num}@foodgram.local'
+            ) for num in range(3)
+        ]
+        # Тэги создаёт миграция 0002_data
+        tags = list(Tag.objects.order_by('pk')[:2])
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {num}', measurement_unit='г')
+            for num in range(components)
+        )
+        # bulk_create возвращает pk только на Postgres
+        ingredients = list(Ingredient.objects.order_by('-pk')[:components])
+        Recipe.objects.bulk_create(
+            Recipe(author=authors[num % len(authors)], name=f'Рецепт {num}',
+                   text='Текст', cooking_time=10, image='recipes/test.png')
+            for num in range(count)
+        )
+        recipes = list(Recipe.objects.order_by('pk'))
+        RecipeComponent.objects.bulk_create(
+            RecipeComponent(recipe=recipe, ingredient=ingredient, amount=10)
+            for recipe in recipes
+            for ingredient in ingredients
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in tags
+        )
+        return recipes
+
+    return make
@@ -0,0 +1,12 @@
+"""Cached API payloads are not shared where their content differs."""
+
+
+def test_payload_is_cached_per_host(anonymous, make_recipes, settings):
+    settings.ALLOWED_HOSTS = ['one.test', 'two.test']
+    recipe, = make_recipes(1)
+    for host in ('one.test', 'two.test', 'one.test'):
+        response = anonymous.get(
+            f'/api/recipes/{recipe.pk}/', HTTP_HOST=host
+        )
+        assert response.status_code == 200
+        assert response.data['image'].startswith(f'http://{host}/')
@@ -0,0 +1,40 @@
+"""Aggregated shopping cart ingredients follow the recipes in the cart."""
+from io import StringIO
+
+from django.core.management import call_command
+
+from api.models import ShoppingCartIngredient, ShoppingList
+
+
+def cart(user):
+    return {
+        row['name']: row['amount']
+        for row in ShoppingCartIngredient.objects.shop_list(user)
+    }
+
+
+def test_emptied_rows_stay_with_zero_amount(user, make_recipes):
+    first, second = make_recipes(2)
+    for recipe in (first, second):
+        ShoppingList.objects.create(author=user, recipes=recipe)
+    assert set(cart(user).values()) == {20}
+    ShoppingList.objects.filter(recipes=first).delete()
+    assert set(cart(user).values()) == {10}
+    ShoppingList.objects.filter(recipes=second).delete()
+    assert cart(user) == {}
+    rows = ShoppingCartIngredient.objects.filter(user=user)
+    assert rows.count() == 3
+    assert set(rows.values_list('amount', flat=True)) == {0}
+
+
+def test_repair_cart_totals(user, make_recipes):
+    first, second = make_recipes(2)
+    ShoppingList.objects.create(author=user, recipes=first)
+    expected = cart(user)
+    rows = ShoppingCartIngredient.objects.filter(user=user)
+    rows.filter(pk=rows.first().pk).update(amount=0)
+    rows.exclude(pk=rows.first().pk).first().delete()
+    assert cart(user) != expected
+    call_command('repair_cart_totals', stdout=StringIO())
+    assert cart(user) == expected
+    assert ShoppingCartIngredient.objects.rebuild([user.pk]) == 0
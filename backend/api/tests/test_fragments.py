@@ -0,0 +1,42 @@
+"""Cached recipe fragments follow writes that don't save the recipe."""
+from api.caching import RECIPES, bump_generations
+from api.models import Ingredient, RecipeComponent, Tag
+
+
+def refetch(client, recipe):
+    # Внутри транзакции теста on_commit не срабатывает, поколение
+    # сдвигаем сами, как это сделал бы invalidate() после коммита
+    bump_generations(RECIPES)
+    response = client.get(f'/api/recipes/{recipe.pk}/')
+    assert response.status_code == 200
+    return response.data
+
+
+def test_tags_and_components_retire_fragment(user_client, make_recipes):
+    recipe, = make_recipes(1, components=0)
+    data = refetch(user_client, recipe)
+    assert data['ingredients'] == []
+    tag = Tag.objects.exclude(recipes=recipe).first()
+    recipe.tags.add(tag)
+    ingredient = Ingredient.objects.create(
+        name='Соль', measurement_unit='г'
+    )
+    component = RecipeComponent.objects.create(
+        recipe=recipe, ingredient=ingredient, amount=5
+    )
+    data = refetch(user_client, recipe)
+    assert tag.pk in [item['id'] for item in data['tags']]
+    assert [item['id'] for item in data['ingredients']] == [ingredient.pk]
+    recipe.tags.remove(tag)
+    component.delete()
+    data = refetch(user_client, recipe)
+    assert tag.pk not in [item['id'] for item in data['tags']]
+    assert data['ingredients'] == []
+
+
+def test_tag_clear_retires_fragment(user_client, make_recipes):
+    recipe, = make_recipes(1)
+    assert refetch(user_client, recipe)['tags']
+    recipe.tags.first().recipes.clear()
+    tags = refetch(user_client, recipe)['tags']
+    assert len(tags) == 1
@@ -0,0 +1,59 @@
+"""Favorites and the shopping cart read only the listed recipes.
+
+RecipeQuerySet.listed_by() starts from the user's rows, so the recipe table
+is searched by primary key instead of being scanned.
+"""
+import re
+
+import pytest
+from django.db import connection
+
+from api.models import FavorRecipes, Recipe, ShoppingList
+from api.paginators import KeysetPagination
+
+RECIPE_TABLE = Recipe._meta.db_table
+
+
+def recipe_plan(queryset):
+    if connection.vendor == 'postgresql':
+        # На тестовых объёмах Postgres и так прочитает таблицу целиком,
+        # проверяем, что доступ по первичному ключу вообще возможен
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+    return queryset.explain()
+
+
+def read_by_primary_key(plan):
+    if connection.vendor == 'postgresql':
+        return f'{RECIPE_TABLE}_pkey on {RECIPE_TABLE}' in plan
+    return re.search(
+        rf'SEARCH (TABLE )?{RECIPE_TABLE} USING INTEGER PRIMARY KEY', plan
+    ) is not None
+
+
+@pytest.mark.parametrize('related_name, model', [
+    ('favorite_recipes', FavorRecipes),
+    ('shop_list', ShoppingList),
+])
+def test_listed_by_reads_recipes_by_primary_key(user, make_recipes,
+                                                related_name, model):
+    recipes = make_recipes(50)
+    model.objects.add_recipes(user, [recipe.pk for recipe in recipes[:5]])
+    queryset = Recipe.objects.select_related('author').opt_annotations(
+        user
+    ).listed_by(user, related_name)
+    plan = recipe_plan(queryset)
+    assert read_by_primary_key(plan), plan
+    latest_first = model.objects.filter(author=user).order_by('-pk')
+    assert list(queryset.values_list('pk', flat=True)) == list(
+        latest_first.values_list('recipes_id', flat=True)
+    )
+
+
+def test_cursor_keeps_only_listed_ordering(user, rf):
+    paginator = KeysetPagination()
+    request = rf.get('/api/recipes/')
+    listed = Recipe.objects.listed_by(user, 'favorite_recipes')
+    assert paginator.get_ordering(request, listed, None) == ('-added', )
+    by_name = Recipe.objects.order_by('name')
+    assert paginator.get_ordering(request, by_name, None) == ('-pk', )
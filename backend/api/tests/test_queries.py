@@ -0,0 +1,51 @@
+"""The recipe list and detail take a constant number of queries.
+
+Query counts are checked with a cold cache, when every recipe fragment
+(see api.fragments) is serialized from the database.
+"""
+import pytest
+
+from api.paginators import PageNumberPaginatorModified
+
+# COUNT(*), страница рецептов с авторами, тэги и ингредиенты фрагментов
+ANONYMOUS_LIST_QUERIES = 4
+# Плюс подписки пользователя для is_subscribed
+LIST_QUERIES = 5
+DETAIL_QUERIES = 4
+
+
+@pytest.fixture(autouse=True)
+def large_pages(monkeypatch):
+    monkeypatch.setattr(PageNumberPaginatorModified, 'max_page_size', 500)
+
+
+@pytest.mark.parametrize('limit', [6, 50, 500])
+def test_anonymous_list(anonymous, make_recipes, limit,
+                        django_assert_num_queries):
+    make_recipes(limit)
+    with django_assert_num_queries(ANONYMOUS_LIST_QUERIES):
+        response = anonymous.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
+
+
+@pytest.mark.parametrize('limit', [6, 50, 500])
+def test_list(user_client, make_recipes, limit, django_assert_num_queries):
+    make_recipes(limit)
+    with django_assert_num_queries(LIST_QUERIES):
+        response = user_client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    results = response.data['results']
+    assert len(results) == limit
+    assert all(len(recipe['ingredients']) == 3 for recipe in results)
+    assert all(len(recipe['tags']) == 2 for recipe in results)
+
+
+@pytest.mark.parametrize('components', [6, 50, 500])
+def test_detail(user_client, make_recipes, components,
+                django_assert_num_queries):
+    recipe, = make_recipes(1, components=components)
+    with django_assert_num_queries(DETAIL_QUERIES):
+        response = user_client.get(f'/api/recipes/{recipe.pk}/')
+    assert response.status_code == 200
+    assert len(response.data['ingredients']) == components
@@ -0,0 +1,31 @@
+"""AsyncRouter serves coroutine views only in the ASGI mode."""
+import asyncio
+
+import pytest
+from asgiref.sync import async_to_sync
+from rest_framework.test import APIRequestFactory
+
+from api.routers import AsyncRouter
+from api.views import TagViewSet
+
+
+def tag_list_view():
+    router = AsyncRouter()
+    router.register('tags', TagViewSet, basename='tags')
+    return next(url.callback for url in router.urls if url.name == 'tags-list')
+
+
+@pytest.mark.parametrize('async_views', [False, True])
+def test_router_views(settings, db, async_views):
+    settings.ASYNC_VIEWS = async_views
+    view = tag_list_view()
+    assert asyncio.iscoroutinefunction(view) is async_views
+    request = APIRequestFactory().get('/api/tags/')
+    if async_views:
+        response = async_to_sync(view)(request)
+        # Ответ рендерится в потоке пула вместе с view
+        assert response.is_rendered
+    else:
+        response = view(request)
+    assert response.status_code == 200
+    assert len(response.data) > 0
@@ -1,10 +1,11 @@
 from django.urls import include, path
-from rest_framework.routers import SimpleRouter
 
-from api.views import (FavoriteViewSet, IngredientViewSet, RecipeViewSet,
-                       ShoppingCartDL, ShoppingViewSet, TagViewSet)
+from api.routers import AsyncRouter
+from api.views import (BulkFavoriteView, BulkShoppingView, FavoriteViewSet,
+                       IngredientViewSet, RecipeViewSet, ShoppingCartDL,
+                       ShoppingViewSet, TagViewSet)
 
-v1_router = SimpleRouter()
+v1_router = AsyncRouter()
 v1_router.register('ingredients', IngredientViewSet, basename='ingredients')
 v1_router.register('recipes', RecipeViewSet, basename='recipes')
 v1_router.register('tags', TagViewSet, basename='tags')
@@ -20,6 +21,14 @@ urlpatterns = [
         'recipes/<int:recipe_id>/shopping_cart/',
         ShoppingViewSet.as_view(), name='add_to_shop'
     ),
+    path(
+        'recipes/favorite/',
+        BulkFavoriteView.as_view(), name='bulk_favorites'
+    ),
+    path(
+        'recipes/shopping_cart/',
+        BulkShoppingView.as_view(), name='bulk_shop'
+    ),
     path(
         'recipes/download_shopping_cart/',
         ShoppingCartDL.as_view(), name='shopping_cart_dl'
@@ -1,42 +1,43 @@
-from django.core.cache import cache
-from django.http import HttpResponse
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from api.autocomplete import ingredient_index
+from api.caching import (INGREDIENTS, RECIPES, TAGS, GenerationCacheMixin,
+                         conditional_response)
+from api.catalog import CatalogViewMixin, catalog
 from api.filters import IngredientFilter, RecipeFilter
-from api.models import (FavorRecipes, Ingredient, Recipe, RecipeComponent,
-                        ShoppingList, Tag)
+from api.models import (FavorRecipes, Ingredient, Recipe,
+                        ShoppingCartIngredient, ShoppingList, Tag)
+from api.paginators import OptionalKeysetPagination
 from api.permissions import IsOwnerOrReadOnly
+from api.renderers import (CSVShoppingListRenderer, JSONShoppingListRenderer,
+                           NDJSONShoppingListRenderer,
+                           TextShoppingListRenderer)
 from api.serializers import (FavorSerializer, IngredientSerializer,
-                             RecipeReadSerializer, RecipeWriteSerializer,
-                             ShoppingSerializer, TagSerializer)
+                             RecipeIdsSerializer, RecipeReadSerializer,
+                             RecipeWriteSerializer, ShoppingSerializer,
+                             TagSerializer)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(GenerationCacheMixin, viewsets.ModelViewSet):
     filter_class = RecipeFilter
     permission_classes = [IsOwnerOrReadOnly]
-    queryset = Recipe.objects.prefetch_related(
-        'ingredients', 'author', 'tags'
-    )
+    pagination_class = OptionalKeysetPagination
+    # Тэги и ингредиенты подгружаются в api.fragments только для рецептов,
+    # которых нет в кэше фрагментов
+    queryset = Recipe.objects.select_related('author')
+    cache_scopes = (RECIPES, )
+    per_user_cache = True
 
     def get_queryset(self):
-        user = self.request.user
-        queryset = cache.get('recipes_qs')
-        if not queryset:
-            queryset = super(RecipeViewSet, self).get_queryset()
-            cache.set('recipes_qs', queryset)
-        if user.is_anonymous or user is None:
-            return queryset
-        user_qs = cache.get('recipes_user_%s' % user.id)
-        if not user_qs:
-            user_qs = queryset.opt_annotations(user)
-            cache.set('recipes_user_%s' % user.id, user_qs)
-        return user_qs
+        queryset = super(RecipeViewSet, self).get_queryset()
+        return queryset.opt_annotations(self.request.user)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -59,21 +60,47 @@ class RecipeViewSet(viewsets.ModelViewSet):
         context.update({'request': self.request})
         return context
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Recipes of followed authors, newest first."""
+        queryset = self.filter_queryset(
+            self.get_queryset().feed(request.user)
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny, )
     filter_class = IngredientFilter
     search_fields = ['name', ]
     pagination_class = None
-
-    def get_queryset(self):
-        queryset = cache.get('ingredients_qs')
-        if not queryset:
-            queryset = Ingredient.objects.all()
-            cache.set('ingredients_qs', queryset)
-        return queryset
+    catalog_scope = INGREDIENTS
+    autocomplete_query_param = 'autocomplete'
+
+    def list(self, request, *args, **kwargs):
+        """Serve ?autocomplete= lookups from the in-memory ranked index.
+
+        ?name= keeps its case-insensitive substring filter over all rows.
+        """
+        params = request.query_params
+        version = catalog.get(INGREDIENTS).generation
+        query = params.get(self.autocomplete_query_param)
+        if query:
+            return conditional_response(
+                request, version,
+                lambda: Response(ingredient_index.search(query))
+            )
+        if params.get('name'):
+            return conditional_response(
+                request, version, lambda: Response(self.get_serializer(
+                    self.filter_queryset(self.get_queryset()), many=True
+                ).data)
+            )
+        return super().list(request, *args, **kwargs)
 
 
 class CommonViewSet(APIView):
@@ -110,17 +137,41 @@ class CommonViewSet(APIView):
         )
 
 
+class BulkRecipesView(APIView):
+    """Add (POST) or remove (DELETE) a list of recipes in one request.
+
+    Takes {"ids": [...]} and answers with the status of every id.
+    """
+
+    permission_classes = [IsAuthenticated]
+    model = None
+
+    def post(self, request):
+        return self.respond(request, self.model.objects.add_recipes)
+
+    def delete(self, request):
+        return self.respond(request, self.model.objects.remove_recipes)
+
+    def respond(self, request, method):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        results = method(request.user, ids)
+        return Response([{'id': pk, 'status': results[pk]} for pk in ids])
+
+
 class FavoriteViewSet(CommonViewSet):
     obj = Recipe
     serializer_class = FavorSerializer
     del_obj = FavorRecipes
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    catalog_scope = TAGS
 
 
 class ShoppingViewSet(CommonViewSet):
@@ -129,18 +180,40 @@ class ShoppingViewSet(CommonViewSet):
     del_obj = ShoppingList
 
 
+class BulkFavoriteView(BulkRecipesView):
+    model = FavorRecipes
+
+
+class BulkShoppingView(BulkRecipesView):
+    model = ShoppingList
+
+
 class ShoppingCartDL(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = [
+        TextShoppingListRenderer, CSVShoppingListRenderer,
+        JSONShoppingListRenderer, NDJSONShoppingListRenderer
+    ]
 
-    @method_decorator(cache_page(60 * 60))
     def get(self, request):
-        """Download a shopping list with aggregated sum of ingredients."""
-        user = request.user
-        shop_list = RecipeComponent.objects.shop_list(user=user)
-        wishlist = [f'{item["name"]} - {item["sum"]} '
-                    f'{item["unit"]} \r\n' for item in shop_list]
-        wishlist.append('\r\n')
-        wishlist.append('FoodGram, 2021')
-        response = HttpResponse(wishlist, 'Content-Type: text/plain')
-        response['Content-Disposition'] = 'attachment; filename="wishlist.txt"'
+        """Stream a shopping list in the format picked with ?format=."""
+        renderer = request.accepted_renderer
+        shop_list = ShoppingCartIngredient.objects.shop_list(
+            user=request.user
+        )
+        if settings.ASYNC_VIEWS:
+            # Под ASGI Django 3.1 перебирает потоковый ответ в цикле
+            # событий, где ORM недоступен: строки выбираем сразу
+            shop_list = list(shop_list)
+        else:
+            shop_list = shop_list.iterator(
+                chunk_size=settings.STREAM_CHUNK_SIZE
+            )
+        response = StreamingHttpResponse(
+            renderer.stream(shop_list),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="wishlist.{renderer.format}"'
+        )
         return response
@@ -9,6 +9,35 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 PAGE_SIZE = 6
 
+MAX_PAGE_SIZE = 100
+
+CACHE_TTL = 60 * 15
+FRAGMENT_TTL = 60 * 60 * 24
+
+STREAM_CHUNK_SIZE = 2000
+
+BULK_RECIPES_LIMIT = 100
+
+AUTOCOMPLETE_LIMIT = 20
+AUTOCOMPLETE_SIMILARITY = 0.3
+
+SEARCH_CONFIG = 'russian'
+
+FEED_FANOUT_LIMIT = 10000
+FEED_BACKFILL = 30
+FEED_BATCH_SIZE = 1000
+
+IMAGE_RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+IMAGE_QUALITY = 80
+BACKGROUND_WORKERS = 2
+
+# Под ASGI горячие чтения обслуживаются асинхронными view, см. api.routers
+ASYNC_VIEWS = os.getenv('SERVER_MODE') == 'asgi'
+
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 DEBUG = bool(util.strtobool(os.getenv('DEBUG_MODE')))
@@ -35,6 +64,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -1,11 +1,14 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from api.metrics import metrics_view
 from foodgram_api import settings
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    # nginx проксирует только /api/ и /admin/, метрики доступны изнутри
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
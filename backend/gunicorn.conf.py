@@ -0,0 +1,16 @@
+"""Gunicorn settings, picked up from the working directory on start.
+
+SERVER_MODE=asgi serves foodgram_api.asgi with uvicorn workers instead of
+the default synchronous WSGI workers, the same variable switches the hot
+read views to async (see api.routers). The number of workers is taken from
+WEB_CONCURRENCY in both modes, so the two setups are compared as equals.
+"""
+import os
+
+bind = '0.0.0.0:8000'
+
+if os.environ.get('SERVER_MODE') == 'asgi':
+    wsgi_app = 'foodgram_api.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram_api.wsgi:application'
@@ -1,6 +1,6 @@
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
-from django.db.models import BooleanField, Count, Value
+from django.db.models import BooleanField, Value
 
 
 class UserQuerySet(models.QuerySet):
@@ -8,9 +8,8 @@ class UserQuerySet(models.QuerySet):
         """Filter followers and get related recipes."""
         queryset = self.filter(
             following__user=user
-        ).order_by('pk').prefetch_related('recipes').annotate(
-            is_subscribed=Value(True, output_field=BooleanField()),
-            recipes_count=Count('recipes__author')
+        ).order_by('pk').annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
         )
         return queryset
 
@@ -24,6 +23,13 @@ class User(AbstractUser):
     email = models.EmailField(
         verbose_name='email', unique=True, null=True
     )
+    # Счётчики обновляются сигналами, починить: manage.py repair_counters
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписчиков'
+    )
     # Согласно API docs эти поля обязательные, другой вопрос, что в админке
     # пользователя можно создать и без них
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
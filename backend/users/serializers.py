@@ -1,15 +1,37 @@
 from rest_framework import serializers
 
+from api.images import RenditionsField
 from api.models import Recipe
 from users.models import Follow, User
 
 
+def get_recipes_limit(request):
+    """Parse ?recipes_limit=, no or broken value means all recipes."""
+    num = request.query_params.get('recipes_limit', '')
+    return int(num) if num.isdigit() else None
+
+
+def get_followed_ids(request):
+    """Fetch ids of authors followed by the user once per request.
+
+    Every serializer nesting UserSerializer shares the set, so a page of
+    recipes or users costs one query instead of one per rendered author.
+    """
+    if not hasattr(request, '_followed_ids'):
+        request._followed_ids = set(Follow.objects.filter(
+            user=request.user
+        ).values_list('author_id', flat=True))
+    return request._followed_ids
+
+
 class RecipeTinySerializer(serializers.ModelSerializer):
     """Return a short form of recipe for repr as nested."""
 
+    images = RenditionsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -62,13 +84,15 @@ class FollowReadSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes(self, obj):
-        """Return necessary amount of recipes."""
-        num = self.context["request"].query_params.get('recipes_limit')
-        if num:
-            num = int(num)
+        """Return necessary amount of recipes.
+
+        FollowReadViewSet attaches them to the whole page beforehand, a
+        single author (e.g. right after subscribing) is queried here.
+        """
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            num = get_recipes_limit(self.context['request'])
             recipes = obj.recipes.all()[:num]
-        else:
-            recipes = obj.recipes.all()
         return RecipeTinySerializer(recipes, many=True).data
 
 
@@ -92,7 +116,5 @@ class UserSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, author):
         request = self.context.get('request')
         if request.user and request.user.is_authenticated:
-            return Follow.objects.filter(
-                user=request.user, author=author
-            ).exists()
+            return author.id in get_followed_ids(request)
         return False
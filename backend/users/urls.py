@@ -1,9 +1,9 @@
 from django.urls import include, path
-from rest_framework.routers import SimpleRouter
 
+from api.routers import AsyncRouter
 from users.views import FollowReadViewSet, FollowViewSet
 
-v1_user_router = SimpleRouter()
+v1_user_router = AsyncRouter()
 v1_user_router.register(
     'users/subscriptions', viewset=FollowReadViewSet, basename='subscriptions'
 )
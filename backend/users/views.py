@@ -1,4 +1,6 @@
 """Move user's logic to the appropriate app."""
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -9,16 +11,18 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from api.paginators import PageNumberPaginatorModified
+from api.caching import RECIPES, GenerationCacheMixin
+from api.models import Recipe
+from api.paginators import FollowKeysetPagination
 from api.permissions import IsOwnerOrReadOnly
 from users.models import Follow
 from users.serializers import (FollowReadSerializer, FollowSerializer,
-                               UserSerializer)
+                               UserSerializer, get_recipes_limit)
 
 User = get_user_model()
 
 
-class FollowReadViewSet(ReadOnlyModelViewSet):
+class FollowReadViewSet(GenerationCacheMixin, ReadOnlyModelViewSet):
     """Get paginated list of user's subscriptions.
 
     According to the frontend requests I came to conclusion that the nested
@@ -29,12 +33,29 @@ class FollowReadViewSet(ReadOnlyModelViewSet):
 
     serializer_class = FollowReadSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = PageNumberPaginatorModified
+    pagination_class = FollowKeysetPagination
+    cache_scopes = (RECIPES, )
+    per_user_cache = True
 
     def get_queryset(self):
         qs = User.ext_objects.follow_recipes(user=self.request.user).all()
         return qs
 
+    def paginate_queryset(self, queryset):
+        """Attach latest recipes of the page authors with one query."""
+        page = super().paginate_queryset(queryset)
+        if page is None:
+            return page
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_authors(
+            [author.id for author in page],
+            get_recipes_limit(self.request)
+        ):
+            recipes[recipe.author_id].append(recipe)
+        for author in page:
+            author.latest_recipes = recipes[author.id]
+        return page
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'request': self.request})